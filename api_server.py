@@ -3,20 +3,200 @@
 Simple API server for MuseTalk lip sync service
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
+import json
 import os
+import shutil
 import tempfile
-from musetalk_wrapper import run_musetalk
+import time
+import uuid
+import zipfile
+import metrics
+from musetalk_wrapper import (run_musetalk, run_musetalk_batch, warm_up, prepare_avatar, get_result_cache,
+                              get_engine, get_pool, render_cost, cached_result, scratch_space, BACKEND, FFMPEG_BIN)
+from audio_utils import audio_duration
+from avatar_registry import AvatarRegistry, ALLOWED_SUFFIXES, READY
+from jobs import JobManager, QueueFull, DONE, FAILED, CANCELLED, INTERACTIVE, BATCH, PRIORITIES
+from progress import EVENT_MEDIA_TYPES, PROGRESS_HEARTBEAT_SECONDS, encode_event
+from result_store import ResultStore, RESULT_RETENTION_SECONDS
 
 app = Flask(__name__)
+# Let a fronting nginx/Apache send result files itself (X-Sendfile) instead of streaming them through Python
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "0") == "1"
 
 # Path to the avatar video
-AVATAR_VIDEO_PATH = "/app/assets/avatar_video.mp4"
+AVATAR_VIDEO_PATH = os.environ.get("AVATAR_VIDEO_PATH", "/app/assets/avatar_video.mp4")
+
+# Avatar used when a request does not name one
+DEFAULT_AVATAR_ID = "default"
+
+# Upper bound on clips per /lipsync/batch request
+BATCH_MAX_CLIPS = int(os.environ.get("BATCH_MAX_CLIPS", "64"))
+
+# Rendered MP4s stay downloadable by content hash for RESULT_RETENTION_SECONDS
+results = ResultStore()
+
+
+def render_and_store(audio_path: str, image_path: str, output_path: str, cancel=None, progress=None) -> dict:
+    """run_musetalk, then move the MP4 into the result store so it outlives the request."""
+    result = run_musetalk(audio_path, image_path, output_path, cancel, progress)
+    if result.get("success"):
+        result["result_id"] = results.put(result["output"])
+        result["output"] = str(results.path(result["result_id"]))
+    return result
+
+
+def cached_and_stored(audio_path: str, image_path: str):
+    """Result id of a result-cache hit, moved into the result store without queueing; None on a miss."""
+    results.root.mkdir(parents=True, exist_ok=True)
+    staging = str(results.root / f"{uuid.uuid4().hex}.part")
+    try:
+        if cached_result(audio_path, image_path, staging) is None:
+            return None
+        return results.put(staging)
+    finally:
+        if os.path.exists(staging):
+            os.unlink(staging)
+
+
+# Background workers for /lipsync and the asynchronous /jobs API
+# Bounded queue for /lipsync and /jobs: over JOB_MAX_QUEUE or JOB_MAX_QUEUED_SECONDS, submissions get a 429.
+# Cheapest jobs (short audio, avatar already prepared) run first; interactive ahead of batch.
+jobs = JobManager(render_and_store, measure=lambda path: audio_duration(path, FFMPEG_BIN), estimate=render_cost)
+
+# Uploaded avatars, prepared once and then picked per request with avatar_id
+avatars = AvatarRegistry(prepare_avatar)
+avatars.register_builtin(DEFAULT_AVATAR_ID, AVATAR_VIDEO_PATH, name="Default avatar")
+
+metrics.QUEUE_DEPTH.set_function(jobs.queue_depth)
+metrics.QUEUE_AUDIO_SECONDS.set_function(jobs.backlog_seconds)
+metrics.JOBS_STALLED.set_function(jobs.stalled)
+metrics.watch_cache("result", lambda: get_result_cache().stats() if get_result_cache() else None)
+if BACKEND == "engine":
+    metrics.watch_cache("feature", lambda: get_engine().feature_cache_stats())
+    metrics.watch_cache("avatar_memory", lambda: get_engine().hot_avatars.stats())
+
+
+class _ZipSink:
+    """Write-only file object that lets zipfile output be drained chunk by chunk."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def health_info() -> dict:
+    cache = get_result_cache()
+    return {
+        "status": "healthy",
+        "service": "musetalk",
+        "result_cache": cache.stats() if cache is not None else None,
+        "feature_cache": get_engine().feature_cache_stats() if BACKEND == "engine" else None,
+        "avatar_memory": get_engine().hot_avatars.stats() if BACKEND == "engine" else None,
+        "queue": jobs.stats(),
+        "scratch": scratch_space.stats(),
+        "pool": get_pool().stats() if BACKEND == "pool" else None,
+    }
+
+
+def _resolve_avatar():
+    """Video path for the request's avatar_id form field, or (None, error response)."""
+    avatar_id = request.form.get('avatar_id') or DEFAULT_AVATAR_ID
+    try:
+        return avatars.resolve(avatar_id), None
+    except KeyError:
+        return None, (jsonify({"error": f"Unknown avatar: {avatar_id}"}), 404)
+    except RuntimeError as e:
+        return None, (jsonify({"error": str(e), "avatar": avatars.get(avatar_id)}), 409)
+
+
+def _priority(default: str):
+    """Scheduling class from the request's priority form field, or (None, error response)."""
+    priority = request.form.get('priority') or default
+    if priority not in PRIORITIES:
+        return None, (jsonify({"error": f"Unknown priority (allowed: {', '.join(PRIORITIES)})"}), 400)
+    return priority, None
+
+
+def _busy(error: QueueFull):
+    """429 with a Retry-After for a refused submission."""
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
+
+
+def _send_result(result_id: str):
+    """Serve a retained result with ETag, If-None-Match, Range and a cacheable lifetime."""
+    path = results.path(result_id)
+    if path is None:
+        return jsonify({"error": "Result expired or unknown"}), 404
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name="lipsync_result.mp4",
+        mimetype="video/mp4",
+        conditional=True,
+        etag=result_id,
+        max_age=int(RESULT_RETENTION_SECONDS),
+    )
+    response.headers["Content-Location"] = f"/results/{result_id}"
+    return response
+
+
+def _stream_zip(members, cleanup_dir):
+    """Yield a stored (uncompressed) ZIP of (arcname, path or bytes) members, then remove cleanup_dir."""
+    sink = _ZipSink()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            for arcname, source in members:
+                if isinstance(source, bytes):
+                    zf.writestr(arcname, source)
+                else:
+                    with open(source, "rb") as src, zf.open(arcname, "w", force_zip64=True) as dst:
+                        for chunk in iter(lambda: src.read(1 << 20), b""):
+                            dst.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                data = sink.drain()
+                if data:
+                    yield data
+        yield sink.drain()
+    finally:
+        shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.time()
+
+@app.after_request
+def _record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUESTS.labels(route, request.method, response.status_code).inc()
+    if 'request_started' in g:
+        metrics.REQUEST_SECONDS.labels(route).observe(time.time() - g.request_started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition"""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "musetalk"})
+    return jsonify(health_info())
 
 @app.route('/lipsync', methods=['POST'])
 def create_lipsync():
@@ -29,40 +209,43 @@ def create_lipsync():
         audio_file = request.files['audio']
         if audio_file.filename == '':
             return jsonify({"error": "No audio file selected"}), 400
+
+        avatar_path, error = _resolve_avatar()
+        if error:
+            return error
+        priority, error = _priority(INTERACTIVE)
+        if error:
+            return error
         
         # Save uploaded audio to temp file
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
             audio_file.save(temp_audio.name)
             audio_path = temp_audio.name
         
-        # Create output file path
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_output:
-            output_path = temp_output.name
-        
-        # Run MuseTalk
-        result = run_musetalk(
-            audio_path=audio_path,
-            image_path=AVATAR_VIDEO_PATH,  # Using our avatar video
-            output_path=output_path
-        )
-        
-        # Clean up temp audio file
-        os.unlink(audio_path)
+        # Cache hits are served at once instead of waiting for a job worker
+        result_id = cached_and_stored(audio_path, avatar_path)
+        if result_id is not None:
+            return _send_result(result_id)
+
+        # Run MuseTalk on a job worker so concurrent renders stay bounded; the
+        # result is kept in the store so retries can use /results/<id>
+        job = jobs.submit(audio_path=audio_path, image_path=avatar_path, priority=priority)
+        job.future.result()
+        jobs.discard(job.id)
         
-        if result.get("success"):
+        if job.status == DONE:
             # Return the video file
-            return send_file(
-                result.get("output"),
-                as_attachment=True,
-                download_name="lipsync_result.mp4",
-                mimetype="video/mp4"
-            )
+            return _send_result(job.result_id)
+        elif job.status == CANCELLED:
+            return jsonify({"error": "Job was cancelled"}), 409
         else:
             return jsonify({
                 "error": "MuseTalk processing failed",
-                "details": result.get("error", "Unknown error")
+                "details": job.error
             }), 500
             
+    except QueueFull as e:
+        return _busy(e)
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
     finally:
@@ -70,10 +253,236 @@ def create_lipsync():
         try:
             if 'audio_path' in locals() and os.path.exists(audio_path):
                 os.unlink(audio_path)
-            if 'output_path' in locals() and os.path.exists(output_path):
-                os.unlink(output_path)
         except:
             pass
 
+@app.route('/lipsync/batch', methods=['POST'])
+def create_lipsync_batch():
+    """Create lip sync videos for many audio files, returned as a streamed ZIP"""
+    batch_dir = None
+    try:
+        audio_files = [f for f in request.files.getlist('audio') if f.filename]
+        if not audio_files:
+            return jsonify({"error": "No audio file provided"}), 400
+        if len(audio_files) > BATCH_MAX_CLIPS:
+            return jsonify({"error": f"Too many audio files (max {BATCH_MAX_CLIPS})"}), 400
+
+        avatar_path, error = _resolve_avatar()
+        if error:
+            return error
+
+        batch_dir = tempfile.mkdtemp(prefix="batch_")
+        audio_paths = []
+        for i, audio_file in enumerate(audio_files):
+            path = os.path.join(batch_dir, f"audio_{i:03d}.mp3")
+            audio_file.save(path)
+            audio_paths.append(path)
+        # Batches run outside the job queue, but are refused while it is over its limits
+        # and count towards them until they finish
+        seconds = sum(jobs.duration(path) for path in audio_paths)
+        jobs.admit(seconds, reserve=True)
+        try:
+            result = run_musetalk_batch(
+                audio_paths=audio_paths,
+                image_path=avatar_path,
+                output_dir=os.path.join(batch_dir, "out")
+            )
+        finally:
+            jobs.release(seconds)
+
+        manifest = []
+        members = []
+        for i, (audio_file, clip) in enumerate(zip(audio_files, result["results"])):
+            entry = {"index": i, "filename": audio_file.filename, "success": bool(clip.get("success"))}
+            if clip.get("success"):
+                entry["file"] = f"clip_{i:03d}.mp4"
+                members.append((entry["file"], clip["output"]))
+            else:
+                entry["error"] = clip.get("error", "Unknown error")
+            manifest.append(entry)
+
+        if not members:
+            return jsonify({
+                "error": "MuseTalk processing failed",
+                "details": manifest
+            }), 500
+
+        members.insert(0, ("manifest.json", json.dumps(manifest, indent=2).encode("utf-8")))
+        response = Response(
+            _stream_zip(members, batch_dir),
+            mimetype="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="lipsync_batch.zip"'}
+        )
+        # The stream now owns batch_dir and removes it once fully sent
+        batch_dir = None
+        return response
+
+    except QueueFull as e:
+        return _busy(e)
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        if batch_dir is not None:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+@app.route('/avatars', methods=['POST'])
+def create_avatar():
+    """Upload an avatar video; it is preprocessed in the background"""
+    try:
+        if 'video' not in request.files:
+            return jsonify({"error": "No video file provided"}), 400
+
+        video_file = request.files['video']
+        if video_file.filename == '':
+            return jsonify({"error": "No video file selected"}), 400
+
+        suffix = os.path.splitext(video_file.filename)[1].lower()
+        if suffix not in ALLOWED_SUFFIXES:
+            return jsonify({"error": f"Unsupported video type (allowed: {', '.join(ALLOWED_SUFFIXES)})"}), 400
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_video:
+            video_file.save(temp_video.name)
+            video_path = temp_video.name
+
+        avatar, created = avatars.add(video_path, name=request.form.get('name'))
+        avatar["status_url"] = f"/avatars/{avatar['avatar_id']}"
+        if avatar["status"] == READY:
+            return jsonify(avatar), 201 if created else 200
+        return jsonify(avatar), 202
+
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        try:
+            if 'video_path' in locals() and os.path.exists(video_path):
+                os.unlink(video_path)
+        except:
+            pass
+
+@app.route('/avatars', methods=['GET'])
+def list_avatars():
+    """Registered avatars, most used first"""
+    return jsonify({"avatars": avatars.list()})
+
+@app.route('/avatars/<avatar_id>', methods=['GET'])
+def get_avatar(avatar_id):
+    """Avatar status"""
+    avatar = avatars.get(avatar_id)
+    if avatar is None:
+        return jsonify({"error": "Unknown avatar"}), 404
+    return jsonify(avatar)
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a lip sync job and return its id immediately"""
+    try:
+        if 'audio' not in request.files:
+            return jsonify({"error": "No audio file provided"}), 400
+
+        audio_file = request.files['audio']
+        if audio_file.filename == '':
+            return jsonify({"error": "No audio file selected"}), 400
+
+        avatar_path, error = _resolve_avatar()
+        if error:
+            return error
+        priority, error = _priority(BATCH)
+        if error:
+            return error
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
+            audio_file.save(temp_audio.name)
+            audio_path = temp_audio.name
+
+        job = jobs.submit(audio_path=audio_path, image_path=avatar_path, priority=priority)
+        body = job.to_dict()
+        body["status_url"] = f"/jobs/{job.id}"
+        body["events_url"] = f"/jobs/{job.id}/events"
+        body["result_url"] = f"/jobs/{job.id}/result"
+        return jsonify(body), 202
+
+    except QueueFull as e:
+        return _busy(e)
+    except Exception as e:
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        try:
+            if 'audio_path' in locals() and os.path.exists(audio_path):
+                os.unlink(audio_path)
+        except:
+            pass
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+def _event_format() -> str:
+    """NDJSON if asked for with ?format=ndjson or Accept: application/x-ndjson, else server-sent events"""
+    if request.args.get("format") == "ndjson" or EVENT_MEDIA_TYPES["ndjson"] in request.headers.get("Accept", ""):
+        return "ndjson"
+    return "sse"
+
+def _job_events(job, fmt: str):
+    """Yield the job's state on every change (and every heartbeat) until it finishes."""
+    while True:
+        seen = job.progress.version
+        name, data = job.event()
+        yield encode_event(name, data, fmt)
+        if name in (DONE, FAILED, CANCELLED):
+            return
+        job.progress.wait(seen, PROGRESS_HEARTBEAT_SECONDS)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Stream progress (stage, frames done/total, rate, ETA, stalled) until the job finishes"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    fmt = _event_format()
+    return Response(_job_events(job, fmt), mimetype=EVENT_MEDIA_TYPES[fmt],
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download the MP4 of a finished job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == FAILED:
+        return jsonify({
+            "error": "MuseTalk processing failed",
+            "details": job.error,
+        }), 500
+    if job.status == CANCELLED:
+        return jsonify({"error": "Job was cancelled"}), 410
+    if job.status != DONE:
+        return jsonify({"error": "Job not finished", "status": job.status}), 409
+    return _send_result(job.result_id)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a queued or running job, or delete a finished one and its files"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status in (DONE, FAILED, CANCELLED):
+        jobs.discard(job_id)
+        return jsonify(job.to_dict())
+    jobs.cancel(job_id)
+    # A running job stops at its next cancellation point; poll the status URL to see it settle
+    return jsonify(job.to_dict()), 200 if job.status == CANCELLED else 202
+
+@app.route('/results/<result_id>', methods=['GET'])
+def get_result(result_id):
+    """Download a retained result; supports Range and If-None-Match"""
+    return _send_result(result_id)
+
 if __name__ == '__main__':
+    # Load models once at start so the first request doesn't pay for it
+    print(warm_up(), flush=True)
+    jobs.start()
     app.run(host='0.0.0.0', port=8080, debug=False)
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+ASGI API server for MuseTalk lip sync service - streamed uploads, non-blocking job dispatch
+
+Same routes and responses as api_server.py. Request bodies are parsed as they
+arrive and written straight to disk (hashed in the same pass), and renders are
+handed to the JobManager workers and awaited, so a slow client or a long render
+holds a coroutine rather than a thread.
+
+    python asgi_server.py
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+import metrics
+from api_server import (jobs, avatars, results, health_info, cached_and_stored, _stream_zip, DEFAULT_AVATAR_ID,
+                        BATCH_MAX_CLIPS)
+from audio_utils import SAMPLE_RATE, remember_digest
+from avatar_registry import ALLOWED_SUFFIXES, READY
+from jobs import QueueFull, DONE, FAILED, CANCELLED, INTERACTIVE, BATCH, PRIORITIES
+from musetalk_wrapper import open_stream, run_musetalk_batch, warm_up, TEMP_DIR
+from progress import EVENT_MEDIA_TYPES, PROGRESS_HEARTBEAT_SECONDS, encode_event
+from result_store import RESULT_RETENTION_SECONDS
+
+ASGI_HOST = os.environ.get("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.environ.get("ASGI_PORT", "8080"))
+
+# Uploads land here before being moved into their job dir (same filesystem, so moves are renames)
+UPLOAD_DIR        = os.environ.get("UPLOAD_DIR", os.path.join(TEMP_DIR, "uploads"))
+UPLOAD_MAX_BYTES  = int(os.environ.get("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+# Body bytes gathered before one parser write is handed to a worker thread
+UPLOAD_WRITE_BYTES = 1024 * 1024
+FORM_FIELD_MAX_BYTES = 64 * 1024
+# How often a request waiting on a render checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+# Status logged for requests whose client went away (nginx's convention)
+CLIENT_CLOSED_REQUEST = 499
+# How often a progress stream looks for a change in its job
+PROGRESS_POLL_SECONDS = 0.5
+# uvicorn has no zero-copy file send, so FileResponse streams results through Python in chunks.
+# Behind a proxy, hand the transfer to it instead: RESULT_ACCEL_PREFIX names an nginx internal
+# location aliased to RESULT_DIR (X-Accel-Redirect); USE_X_SENDFILE=1 sends the file path in
+# X-Sendfile (Apache mod_xsendfile, lighttpd), as the Flask app does.
+RESULT_ACCEL_PREFIX = os.environ.get("RESULT_ACCEL_PREFIX", "")
+USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") == "1"
+
+
+class UploadError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class UploadedFile:
+    def __init__(self, field: str, filename: str, path: str, size: int, sha256: str):
+        self.field = field
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class StreamedForm:
+    """MultipartParser callbacks: text fields kept in memory, file parts written to disk and hashed."""
+
+    def __init__(self, dest_dir: str):
+        self.dest_dir = dest_dir
+        self.fields = {}
+        self.files = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = None
+        self._filename = None
+        self._value = None
+        self._file = None
+        self._hash = None
+        self._size = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _headers_finished(self):
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = params.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = params.get(b"filename")
+        self._size = 0
+        if filename is None:
+            self._filename = None
+            self._value = bytearray()
+            return
+        self._filename = os.path.basename(filename.decode("utf-8", errors="replace"))
+        suffix = os.path.splitext(self._filename)[1].lower()
+        self._file = tempfile.NamedTemporaryFile(delete=False, dir=self.dest_dir, prefix="upload_", suffix=suffix)
+        self._hash = hashlib.sha256()
+
+    def _part_data(self, data, start, end):
+        chunk = data[start:end]
+        self._size += len(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            self._hash.update(chunk)
+        else:
+            if self._size > FORM_FIELD_MAX_BYTES:
+                raise UploadError(413, f"Form field {self._name!r} is too large")
+            self._value += chunk
+
+    def _part_end(self):
+        if self._file is None:
+            self.fields[self._name] = self._value.decode("utf-8", errors="replace")
+            return
+        self._file.close()
+        upload = UploadedFile(self._name, self._filename, self._file.name, self._size, self._hash.hexdigest())
+        self._file = None
+        if not upload.filename:
+            os.unlink(upload.path)
+            return
+        remember_digest(upload.path, upload.sha256)
+        self.files.append(upload)
+
+    def get_files(self, field: str) -> list:
+        return [f for f in self.files if f.field == field]
+
+    def cleanup(self) -> None:
+        """Delete every file part still on disk (ones handed off elsewhere are already gone)."""
+        if self._file is not None:
+            self._file.close()
+            self.files.append(UploadedFile(self._name, self._filename, self._file.name, 0, ""))
+            self._file = None
+        for upload in self.files:
+            try:
+                os.unlink(upload.path)
+            except OSError:
+                pass
+
+
+async def read_form(request: Request, dest_dir: str = UPLOAD_DIR) -> StreamedForm:
+    """Parse a multipart body chunk by chunk; disk writes run in the thread pool."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected multipart/form-data")
+    os.makedirs(dest_dir, exist_ok=True)
+    form = StreamedForm(dest_dir)
+    parser = MultipartParser(params[b"boundary"], form.callbacks())
+    received = 0
+    pending = bytearray()
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > UPLOAD_MAX_BYTES:
+                raise UploadError(413, f"Request body exceeds {UPLOAD_MAX_BYTES} bytes")
+            pending += chunk
+            if len(pending) >= UPLOAD_WRITE_BYTES:
+                data, pending = bytes(pending), bytearray()
+                await run_in_threadpool(parser.write, data)
+        if pending:
+            await run_in_threadpool(parser.write, bytes(pending))
+        parser.finalize()
+    except UploadError:
+        form.cleanup()
+        raise
+    except Exception as e:
+        form.cleanup()
+        raise UploadError(400, f"Malformed multipart body: {e}")
+    return form
+
+
+def _error(status: int, message: str, **extra) -> JSONResponse:
+    return JSONResponse({"error": message, **extra}, status_code=status)
+
+
+def _first_file(form: StreamedForm, field: str):
+    files = form.get_files(field)
+    return files[0] if files else None
+
+
+def _send_result(request: Request, result_id: str) -> Response:
+    """Serve a retained result with ETag, If-None-Match and Range (FileResponse or the proxy handles Range)."""
+    path = results.path(result_id)
+    if path is None:
+        return _error(404, "Result expired or unknown")
+    etag = f'"{result_id}"'
+    headers = {
+        "etag": etag,
+        "cache-control": f"public, max-age={int(RESULT_RETENTION_SECONDS)}",
+        "content-location": f"/results/{result_id}",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if request.method in ("GET", "HEAD") and (
+            if_none_match.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    if RESULT_ACCEL_PREFIX or USE_X_SENDFILE:
+        headers["content-disposition"] = 'attachment; filename="lipsync_result.mp4"'
+        if RESULT_ACCEL_PREFIX:
+            headers["x-accel-redirect"] = f"{RESULT_ACCEL_PREFIX.rstrip('/')}/{Path(path).name}"
+        else:
+            headers["x-sendfile"] = str(path)
+        return Response(media_type="video/mp4", headers=headers)
+    return FileResponse(path, media_type="video/mp4", filename="lipsync_result.mp4", headers=headers)
+
+
+async def _await_client(request: Request, future, cancel) -> bool:
+    """Wait for future; if the client disconnects first, run cancel() in the threadpool and wait for the render to unwind.
+
+    Returns False when the client has gone away.
+    """
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return True
+        if await request.is_disconnected():
+            await run_in_threadpool(cancel)
+            await asyncio.wait({future})
+            return False
+
+
+def _resolve_avatar(form: StreamedForm):
+    """Video path for the form's avatar_id, or (None, error response)."""
+    avatar_id = form.fields.get("avatar_id") or DEFAULT_AVATAR_ID
+    try:
+        return avatars.resolve(avatar_id), None
+    except KeyError:
+        return None, _error(404, f"Unknown avatar: {avatar_id}")
+    except RuntimeError as e:
+        return None, _error(409, str(e), avatar=avatars.get(avatar_id))
+
+
+def _priority(form: StreamedForm, default: str):
+    """Scheduling class from the form's priority field, or (None, error response)."""
+    priority = form.fields.get("priority") or default
+    if priority not in PRIORITIES:
+        return None, _error(400, f"Unknown priority (allowed: {', '.join(PRIORITIES)})")
+    return priority, None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load models once at start so the first request doesn't pay for it
+    print(await run_in_threadpool(warm_up), flush=True)
+    jobs.start()
+    yield
+
+
+app = FastAPI(title="MuseTalk lip sync", lifespan=lifespan)
+
+
+@app.exception_handler(UploadError)
+async def _upload_error(request: Request, exc: UploadError):
+    return _error(exc.status, exc.message)
+
+
+@app.exception_handler(QueueFull)
+async def _busy(request: Request, exc: QueueFull):
+    return JSONResponse({"error": str(exc), "retry_after": exc.retry_after}, status_code=429,
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+class RequestMetrics:
+    """Per-route request counts and latency.
+
+    Plain ASGI rather than @app.middleware("http"): that wrapper hides
+    http.disconnect from endpoints, which need it to abandon renders.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.time()
+        status = 500
+
+        async def send_and_record(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.REQUESTS.labels(route, scope["method"], status).inc()
+            metrics.REQUEST_SECONDS.labels(route).observe(time.time() - started)
+
+
+app.add_middleware(RequestMetrics)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition"""
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return health_info()
+
+
+@app.post("/lipsync")
+async def create_lipsync(request: Request):
+    """Create lip sync video from audio; rendered by the job workers and awaited here"""
+    form = await read_form(request)
+    try:
+        audio = _first_file(form, "audio")
+        if audio is None:
+            return _error(400, "No audio file provided")
+
+        avatar_path, error = _resolve_avatar(form)
+        if error:
+            return error
+        priority, error = _priority(form, INTERACTIVE)
+        if error:
+            return error
+
+        # Cache hits are served at once instead of waiting for a job worker
+        result_id = await run_in_threadpool(cached_and_stored, audio.path, avatar_path)
+        if result_id is not None:
+            return _send_result(request, result_id)
+
+        job = await run_in_threadpool(jobs.submit, audio_path=audio.path, image_path=avatar_path, priority=priority)
+        connected = await _await_client(request, asyncio.wrap_future(job.future), lambda: jobs.cancel(job.id))
+        # The MP4 now lives in the result store; the job entry is no longer needed
+        await run_in_threadpool(jobs.discard, job.id)
+        if not connected:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+        if job.status == DONE:
+            return _send_result(request, job.result_id)
+        if job.status == CANCELLED:
+            return _error(409, "Job was cancelled")
+        return _error(500, "MuseTalk processing failed", details=job.error)
+    finally:
+        form.cleanup()
+
+
+@app.post("/lipsync/batch")
+async def create_lipsync_batch(request: Request):
+    """Create lip sync videos for many audio files, returned as a streamed ZIP"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    batch_dir = tempfile.mkdtemp(prefix="batch_", dir=UPLOAD_DIR)
+    try:
+        form = await read_form(request, dest_dir=batch_dir)
+        audio_files = form.get_files("audio")
+        if not audio_files:
+            return _error(400, "No audio file provided")
+        if len(audio_files) > BATCH_MAX_CLIPS:
+            return _error(400, f"Too many audio files (max {BATCH_MAX_CLIPS})")
+
+        avatar_path, error = _resolve_avatar(form)
+        if error:
+            return error
+        # Batches run outside the job queue, but are refused while it is over its limits
+        # and count towards them until they finish
+        seconds = await run_in_threadpool(lambda: sum(jobs.duration(f.path) for f in audio_files))
+        jobs.admit(seconds, reserve=True)
+
+        cancel = threading.Event()
+        render = asyncio.ensure_future(run_in_threadpool(
+            run_musetalk_batch,
+            audio_paths=[f.path for f in audio_files],
+            image_path=avatar_path,
+            output_dir=os.path.join(batch_dir, "out"),
+            cancel=cancel,
+        ))
+        # The render outlives a disconnected client until it notices the cancel
+        render.add_done_callback(lambda _: jobs.release(seconds))
+        if not await _await_client(request, render, cancel.set):
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+        result = render.result()
+
+        manifest = []
+        members = []
+        for i, (audio_file, clip) in enumerate(zip(audio_files, result["results"])):
+            entry = {"index": i, "filename": audio_file.filename, "success": bool(clip.get("success"))}
+            if clip.get("success"):
+                entry["file"] = f"clip_{i:03d}.mp4"
+                members.append((entry["file"], clip["output"]))
+            else:
+                entry["error"] = clip.get("error", "Unknown error")
+            manifest.append(entry)
+
+        if not members:
+            return _error(500, "MuseTalk processing failed", details=manifest)
+
+        members.insert(0, ("manifest.json", json.dumps(manifest, indent=2).encode("utf-8")))
+        response = StreamingResponse(
+            iterate_in_threadpool(_stream_zip(members, batch_dir)),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="lipsync_batch.zip"'},
+        )
+        # The stream now owns batch_dir and removes it once fully sent
+        batch_dir = None
+        return response
+    finally:
+        if batch_dir is not None:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request):
+    """Queue a lip sync job and return its id immediately"""
+    form = await read_form(request)
+    try:
+        audio = _first_file(form, "audio")
+        if audio is None:
+            return _error(400, "No audio file provided")
+
+        avatar_path, error = _resolve_avatar(form)
+        if error:
+            return error
+        priority, error = _priority(form, BATCH)
+        if error:
+            return error
+
+        job = await run_in_threadpool(jobs.submit, audio_path=audio.path, image_path=avatar_path, priority=priority)
+        body = job.to_dict()
+        body["audio_sha256"] = audio.sha256
+        body["status_url"] = f"/jobs/{job.id}"
+        body["events_url"] = f"/jobs/{job.id}/events"
+        body["result_url"] = f"/jobs/{job.id}/result"
+        return JSONResponse(body, status_code=202)
+    finally:
+        form.cleanup()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status"""
+    job = jobs.get(job_id)
+    if job is None:
+        return _error(404, "Unknown job")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a queued or running job, or delete a finished one and its files"""
+    job = jobs.get(job_id)
+    if job is None:
+        return _error(404, "Unknown job")
+    if job.status in (DONE, FAILED, CANCELLED):
+        await run_in_threadpool(jobs.discard, job_id)
+        return job.to_dict()
+    await run_in_threadpool(jobs.cancel, job_id)
+    # A running job stops at its next cancellation point; poll the status URL to see it settle
+    return JSONResponse(job.to_dict(), status_code=200 if job.status == CANCELLED else 202)
+
+
+async def _job_events(job, fmt: str):
+    """Yield the job's state on every change (and every heartbeat) until it finishes."""
+    while True:
+        seen = job.progress.version
+        name, data = job.event()
+        yield encode_event(name, data, fmt)
+        if name in (DONE, FAILED, CANCELLED):
+            return
+        # Polled rather than waited on, so idle streams don't each hold a worker thread
+        deadline = time.monotonic() + PROGRESS_HEARTBEAT_SECONDS
+        while job.progress.version == seen and time.monotonic() < deadline:
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, request: Request):
+    """Stream progress (stage, frames done/total, rate, ETA, stalled) until the job finishes"""
+    job = jobs.get(job_id)
+    if job is None:
+        return _error(404, "Unknown job")
+    accept = request.headers.get("accept", "")
+    fmt = "ndjson" if request.query_params.get("format") == "ndjson" or EVENT_MEDIA_TYPES["ndjson"] in accept else "sse"
+    return StreamingResponse(_job_events(job, fmt), media_type=EVENT_MEDIA_TYPES[fmt],
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, request: Request):
+    """Download the MP4 of a finished job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return _error(404, "Unknown job")
+    if job.status == FAILED:
+        return _error(500, "MuseTalk processing failed", details=job.error)
+    if job.status == CANCELLED:
+        return _error(410, "Job was cancelled")
+    if job.status != DONE:
+        return _error(409, "Job not finished", status=job.status)
+    return _send_result(request, job.result_id)
+
+
+@app.get("/results/{result_id}")
+async def get_result(result_id: str, request: Request):
+    """Download a retained result; supports Range and If-None-Match"""
+    return _send_result(request, result_id)
+
+
+@app.websocket("/lipsync/stream")
+async def stream_lipsync(websocket: WebSocket):
+    """Real-time lip sync: PCM in, one JPEG per video frame out, as soon as each chunk's frames are ready.
+
+    Query: avatar_id (optional). The server sends {"type": "ready", ...} once the
+    avatar is loaded. The client then sends 16 kHz mono s16le PCM as binary
+    messages and {"type": "end"} after each utterance; the server answers with
+    binary JPEG frames (to be shown at the announced fps) and {"type": "done", "frames": n}
+    after the last frame of each utterance.
+    """
+    await websocket.accept()
+    avatar_id = websocket.query_params.get("avatar_id") or DEFAULT_AVATAR_ID
+    try:
+        avatar_path = avatars.resolve(avatar_id)
+        session = await run_in_threadpool(open_stream, avatar_path)
+    except KeyError:
+        await websocket.send_json({"type": "error", "error": f"Unknown avatar: {avatar_id}"})
+        await websocket.close(code=1008)
+        return
+    except Exception as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1011)
+        return
+
+    await websocket.send_json({"type": "ready", "avatar_id": avatar_id, "fps": session.fps,
+                               "width": session.width, "height": session.height,
+                               "sample_rate": SAMPLE_RATE, "format": "jpeg"})
+    wake = asyncio.Event()
+
+    async def render_loop():
+        frames = 0
+        try:
+            while True:
+                await wake.wait()
+                wake.clear()
+                # Keep rendering while passes produce output; new input sets wake again
+                while True:
+                    jpegs, done = await run_in_threadpool(session.render)
+                    for jpeg in jpegs:
+                        await websocket.send_bytes(jpeg)
+                    frames += len(jpegs)
+                    if done:
+                        await websocket.send_json({"type": "done", "frames": frames})
+                        frames = 0
+                    elif not jpegs:
+                        break
+        except Exception as e:
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=1011)
+
+    with metrics.STREAMS.track_inprogress():
+        renderer = asyncio.create_task(render_loop())
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    session.feed(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError:
+                        control = {}
+                    if control.get("type") != "end":
+                        await websocket.send_json({"type": "error", "error": 'Expected binary PCM or {"type": "end"}'})
+                        continue
+                    session.end()
+                wake.set()
+        finally:
+            renderer.cancel()
+
+
+@app.post("/avatars")
+async def create_avatar(request: Request):
+    """Upload an avatar video; it is preprocessed in the background"""
+    form = await read_form(request)
+    try:
+        video = _first_file(form, "video")
+        if video is None:
+            return _error(400, "No video file provided")
+        suffix = Path(video.path).suffix
+        if suffix not in ALLOWED_SUFFIXES:
+            return _error(400, f"Unsupported video type (allowed: {', '.join(ALLOWED_SUFFIXES)})")
+
+        avatar, created = await run_in_threadpool(avatars.add, video.path, name=form.fields.get("name"))
+        avatar["status_url"] = f"/avatars/{avatar['avatar_id']}"
+        if avatar["status"] == READY:
+            return JSONResponse(avatar, status_code=201 if created else 200)
+        return JSONResponse(avatar, status_code=202)
+    finally:
+        form.cleanup()
+
+
+@app.get("/avatars")
+async def list_avatars():
+    """Registered avatars, most used first"""
+    return {"avatars": avatars.list()}
+
+
+@app.get("/avatars/{avatar_id}")
+async def get_avatar(avatar_id: str):
+    """Avatar status"""
+    avatar = avatars.get(avatar_id)
+    if avatar is None:
+        return _error(404, "Unknown avatar")
+    return avatar
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=ASGI_HOST, port=ASGI_PORT)
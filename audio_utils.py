@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Audio helpers - decode uploads to the PCM MuseTalk consumes and fingerprint it
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# whisper (and therefore MuseTalk) works on 16 kHz mono
+SAMPLE_RATE = 16000
+
+# Upload byte digests -> decoded PCM hashes, so repeat uploads skip the ffmpeg decode
+_MEMO_MAX = 4096
+_raw_digests = OrderedDict()
+_pcm_hashes = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _file_identity(path: str) -> tuple:
+    # Inode based, so the entry survives the upload being moved into a job dir
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _remember(memo: OrderedDict, key, value) -> None:
+    with _memo_lock:
+        memo[key] = value
+        memo.move_to_end(key)
+        while len(memo) > _MEMO_MAX:
+            memo.popitem(last=False)
+
+
+def remember_digest(path: str, digest: str) -> None:
+    """Record the SHA-256 of path's bytes, computed while the upload was being written."""
+    _remember(_raw_digests, _file_identity(path), digest)
+
+
+def pcm_command(ffmpeg_bin: str, audio_path: str) -> list:
+    """ffmpeg invocation that writes 16 kHz mono s16le PCM to stdout."""
+    return [str(Path(ffmpeg_bin) / "ffmpeg"), "-v", "error", "-nostdin", "-i", audio_path,
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+
+
+def audio_duration(audio_path: str, ffmpeg_bin: str = "/usr/bin") -> float:
+    """Container duration in seconds, via ffprobe."""
+    out = subprocess.run([str(Path(ffmpeg_bin) / "ffprobe"), "-v", "error", "-show_entries", "format=duration",
+                          "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
+                         capture_output=True, text=True, check=True).stdout
+    return float(out.strip())
+
+
+def audio_content_hash(audio_path: str, ffmpeg_bin: str = "/usr/bin", chunk_size: int = 1 << 16) -> str:
+    """SHA-256 of the decoded PCM, so re-encoded or re-tagged copies of a clip hash equal."""
+    with _memo_lock:
+        raw = _raw_digests.get(_file_identity(audio_path))
+        known = _pcm_hashes.get(raw) if raw else None
+    if known:
+        return known
+    h = hashlib.sha256()
+    proc = subprocess.Popen(pcm_command(ffmpeg_bin, audio_path),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for chunk in iter(lambda: proc.stdout.read(chunk_size), b""):
+            h.update(chunk)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {stderr.decode('utf-8', errors='ignore')[-500:]}")
+    digest = h.hexdigest()
+    if raw:
+        _remember(_pcm_hashes, raw, digest)
+    return digest
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Avatar Cache - persist per-avatar preprocessing (bboxes, frames, masks, VAE latents)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+AVATAR_CACHE_DIR = os.environ.get("AVATAR_CACHE_DIR", "/tmp/avatar_cache")
+
+# Hot avatars kept fully in RAM (the rest are memory-mapped from AVATAR_CACHE_DIR)
+AVATAR_MEMORY_BYTES = int(os.environ.get("AVATAR_MEMORY_BYTES", str(4 * 1024 ** 3)))
+AVATAR_MEMORY_MAX   = int(os.environ.get("AVATAR_MEMORY_MAX", "8"))
+
+# Bump when the on-disk layout changes so stale entries are simply ignored
+CACHE_FORMAT = 1
+
+_ARRAYS = ("frames", "coords", "latents", "masks", "mask_shapes", "crop_boxes")
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, memoized on (path, size, mtime) for the process lifetime."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+_probe_memo = {}
+
+
+def video_info(video_path: str, ffmpeg_bin: str = "/usr/bin") -> tuple[float, int, int, int]:
+    """(fps, frame count, width, height) of a video's first stream, memoized by content."""
+    key = file_sha256(video_path)
+    if key not in _probe_memo:
+        out = subprocess.run([str(Path(ffmpeg_bin) / "ffprobe"), "-v", "error", "-select_streams", "v:0",
+                              "-count_packets", "-show_entries", "stream=r_frame_rate,nb_read_packets,width,height",
+                              "-of", "json", video_path], capture_output=True, text=True, check=True).stdout
+        stream = json.loads(out)["streams"][0]
+        num, _, den = stream["r_frame_rate"].partition("/")
+        _probe_memo[key] = (float(num) / float(den or 1), int(stream["nb_read_packets"]),
+                            int(stream["width"]), int(stream["height"]))
+    return _probe_memo[key]
+
+
+def avatar_key(video_path: str, bbox_shift: int, version: str, unet_path: str) -> str:
+    """Cache key: video content plus every parameter that changes the prepared data."""
+    h = hashlib.sha256()
+    h.update(file_sha256(video_path).encode())
+    h.update(f"|bbox_shift={bbox_shift}|version={version}|unet={unet_path}|fmt={CACHE_FORMAT}".encode())
+    return h.hexdigest()[:32]
+
+
+@dataclass
+class PreparedAvatar:
+    """Audio-independent avatar data; arrays are aligned on the frame axis."""
+    key: str
+    fps: float
+    frames: np.ndarray        # (N, H, W, 3) uint8, BGR
+    coords: np.ndarray        # (N, 4) int32 face boxes (x1, y1, x2, y2) incl. extra margin
+    latents: np.ndarray       # (N, C, h, w) float16 VAE latents for the UNet
+    masks: np.ndarray         # (N, Hm, Wm) uint8 blending masks, zero padded
+    mask_shapes: np.ndarray   # (N, 2) int32 real (h, w) of each mask
+    crop_boxes: np.ndarray    # (N, 4) int32 blending crop boxes
+    decoded: int = 0          # source video frames consumed so far (faceless frames are dropped)
+    complete: bool = True     # False while only a prefix of the video has been prepared
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def mask(self, i: int) -> np.ndarray:
+        h, w = self.mask_shapes[i]
+        return self.masks[i, :h, :w]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+
+class AvatarCache:
+    """One directory per key holding .npy arrays that are opened memory-mapped."""
+
+    def __init__(self, cache_dir: str = AVATAR_CACHE_DIR):
+        self.root = Path(cache_dir)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def meta(self, key: str):
+        """The entry's meta.json (frames, decoded, complete, fps) without opening its arrays, or None."""
+        try:
+            meta = json.loads((self.path(key) / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("format") == CACHE_FORMAT else None
+
+    def load(self, key: str):
+        """Return a memory-mapped PreparedAvatar, or None if the key is not cached."""
+        entry = self.path(key)
+        meta_path = entry / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("format") != CACHE_FORMAT:
+                return None
+            arrays = {name: np.load(entry / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+        except (OSError, ValueError):
+            return None
+        if any(len(a) != meta["frames"] for a in arrays.values()):
+            # Caught mid-replacement by a longer prefix; the caller retries under its lock
+            return None
+        return PreparedAvatar(key=key, fps=meta["fps"], decoded=meta.get("decoded", meta["frames"]),
+                              complete=meta.get("complete", True), **arrays)
+
+    def save(self, avatar: PreparedAvatar) -> Path:
+        """Write atomically: build in a sibling temp dir, then rename into place.
+
+        An existing entry is only replaced by one covering more of the video.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        final = self.path(avatar.key)
+        staging = self.root / f".{avatar.key}.{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            for name in _ARRAYS:
+                np.save(staging / f"{name}.npy", np.ascontiguousarray(getattr(avatar, name)))
+            meta = {"format": CACHE_FORMAT, "key": avatar.key, "fps": avatar.fps, "frames": len(avatar),
+                    "decoded": avatar.decoded, "complete": avatar.complete}
+            (staging / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            current = self.load(avatar.key)
+            if current is not None and (current.complete or current.decoded >= avatar.decoded):
+                # Another worker already stored at least as much; keep theirs
+                return final
+            retired = None
+            if final.exists():
+                # Open memory maps of the old arrays stay valid after the rename
+                retired = self.root / f".{avatar.key}.old.{uuid.uuid4().hex}"
+                os.rename(final, retired)
+            try:
+                os.rename(staging, final)
+            except OSError:
+                pass
+            if retired is not None:
+                shutil.rmtree(retired, ignore_errors=True)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return final
+
+
+class HotAvatars:
+    """In-memory LRU of fully loaded avatars, bounded by entry count and bytes.
+
+    Disk entries are memory-mapped, so a cold avatar pays page faults on its first
+    frames; resident copies skip that and stay warm between requests.
+    """
+
+    def __init__(self, max_bytes: int = AVATAR_MEMORY_BYTES, max_entries: int = AVATAR_MEMORY_MAX):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            avatar = self._entries.get(key)
+            if avatar is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return avatar
+
+    def put(self, avatar: PreparedAvatar) -> PreparedAvatar:
+        """Keep a RAM copy of avatar if it fits the budget; return the copy (or avatar itself)."""
+        size = avatar.nbytes
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return avatar
+        resident = PreparedAvatar(key=avatar.key, fps=avatar.fps, decoded=avatar.decoded, complete=avatar.complete,
+                                  **{name: np.array(getattr(avatar, name)) for name in _ARRAYS})
+        with self._lock:
+            old = self._entries.pop(avatar.key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            while self._entries and (len(self._entries) >= self.max_entries
+                                     or self._bytes + size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+            self._entries[avatar.key] = resident
+            self._bytes += size
+        return resident
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
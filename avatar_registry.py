@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Avatar Registry - uploaded avatar videos, preprocessed once and addressed by id
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from avatar_cache import file_sha256
+
+AVATAR_DIR = os.environ.get("AVATAR_DIR", "/tmp/avatars")
+
+PREPARING, READY, FAILED = "preparing", "ready", "failed"
+
+ALLOWED_SUFFIXES = (".mp4", ".mov", ".webm", ".mkv", ".avi")
+
+
+def _public(meta: dict) -> dict:
+    """Copy of meta without server-side paths."""
+    return {k: v for k, v in meta.items() if k != "video_path"}
+
+
+class AvatarRegistry:
+    """One directory per avatar holding the source video and meta.json.
+
+    Ids are derived from the video content, so re-uploading the same file returns
+    the existing avatar. prepare(video_path) runs on a background thread and must
+    return the usual {"success": ..., "error": ...} dict.
+    """
+
+    def __init__(self, prepare: Callable[[str], dict], root: str = AVATAR_DIR):
+        self.prepare = prepare
+        self.root = Path(root)
+        self._avatars = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Pick up avatars registered by a previous run."""
+        if not self.root.is_dir():
+            return
+        for meta_path in self.root.glob("*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if not os.path.exists(meta.get("video_path", "")):
+                continue
+            if meta.get("status") == PREPARING:
+                # Interrupted mid-preparation; a re-upload prepares it again
+                meta["status"] = FAILED
+                meta["error"] = "Preparation interrupted"
+            self._avatars[meta["avatar_id"]] = meta
+
+    def _save(self, meta: dict) -> None:
+        if meta.get("builtin"):
+            return
+        path = self.root / meta["avatar_id"] / "meta.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def register_builtin(self, avatar_id: str, video_path: str, name: str = None) -> dict:
+        """Expose a video that already lives on disk (e.g. the bundled avatar) without copying it."""
+        meta = {
+            "avatar_id": avatar_id,
+            "name": name or avatar_id,
+            "video_path": video_path,
+            "status": READY,
+            "builtin": True,
+            "created": time.time(),
+            "uses": 0,
+        }
+        with self._lock:
+            self._avatars.setdefault(avatar_id, meta)
+            return _public(self._avatars[avatar_id])
+
+    def add(self, upload_path: str, name: str = None) -> tuple:
+        """Take ownership of upload_path and start preparing it; returns (meta, created)."""
+        suffix = Path(upload_path).suffix.lower()
+        if suffix not in ALLOWED_SUFFIXES:
+            os.unlink(upload_path)
+            raise ValueError(f"Unsupported avatar file type {suffix or '(none)'}")
+        avatar_id = file_sha256(upload_path)[:16]
+
+        with self._lock:
+            existing = self._avatars.get(avatar_id)
+            if existing is not None and existing["status"] != FAILED:
+                os.unlink(upload_path)
+                return _public(existing), False
+            avatar_dir = self.root / avatar_id
+            avatar_dir.mkdir(parents=True, exist_ok=True)
+            video_path = avatar_dir / ("video" + suffix)
+            shutil.move(upload_path, video_path)
+            meta = {
+                "avatar_id": avatar_id,
+                "name": name or avatar_id,
+                "video_path": str(video_path),
+                "status": PREPARING,
+                "created": time.time(),
+                "uses": 0,
+            }
+            self._avatars[avatar_id] = meta
+            self._save(meta)
+
+        threading.Thread(target=self._prepare, args=(avatar_id,), name=f"avatar-{avatar_id}", daemon=True).start()
+        return _public(meta), True
+
+    def _prepare(self, avatar_id: str) -> None:
+        meta = self._avatars[avatar_id]
+        t = time.time()
+        try:
+            result = self.prepare(meta["video_path"])
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        with self._lock:
+            meta["prepare_seconds"] = time.time() - t
+            if result.get("success"):
+                meta["status"] = READY
+                meta.pop("error", None)
+                meta.update({k: v for k, v in result.items() if k in ("frames", "fps", "bytes")})
+            else:
+                meta["status"] = FAILED
+                meta["error"] = result.get("error", "Unknown error")
+            self._save(meta)
+
+    def get(self, avatar_id: str) -> Optional[dict]:
+        with self._lock:
+            meta = self._avatars.get(avatar_id)
+            return _public(meta) if meta is not None else None
+
+    def list(self) -> list:
+        with self._lock:
+            metas = [_public(m) for m in self._avatars.values()]
+        return sorted(metas, key=lambda m: (-m["uses"], m["created"]))
+
+    def resolve(self, avatar_id: str) -> str:
+        """Video path for a ready avatar; raises KeyError (unknown) or RuntimeError (not ready)."""
+        with self._lock:
+            meta = self._avatars.get(avatar_id)
+            if meta is None:
+                raise KeyError(avatar_id)
+            if meta["status"] != READY:
+                raise RuntimeError(f"Avatar {avatar_id} is {meta['status']}")
+            meta["uses"] += 1
+            meta["last_used"] = time.time()
+            return meta["video_path"]
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Micro-batching - merge UNet frame batches from concurrent renders into larger GPU batches
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+
+MICROBATCH_MAX_SIZE    = int(os.environ.get("MICROBATCH_MAX_SIZE", "32"))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Single dispatcher thread that coalesces submitted frame batches.
+
+    Every UNet frame is independent of its neighbours, so batches from different
+    jobs (and consecutive batches of the same job) can share one forward pass.
+    run_batch receives a list of submitted items and must return one output per
+    item, in order.
+    """
+
+    def __init__(self, run_batch: Callable[[list], list], max_batch: int = MICROBATCH_MAX_SIZE,
+                 max_wait_ms: float = MICROBATCH_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.batches = 0
+        self.frames = 0
+
+    def submit(self, item, frames: int) -> Future:
+        """Queue item (covering `frames` frames); the future resolves to its output."""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="microbatcher", daemon=True)
+                self._thread.start()
+            self._pending.append((item, frames, future))
+            self._cond.notify()
+        return future
+
+    def _collect(self) -> list:
+        """Block for the first item, then keep adding until full or max_wait has passed."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            batch = [self._pending.popleft()]
+            size = batch[0][1]
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                if self._pending:
+                    if size + self._pending[0][1] > self.max_batch:
+                        break
+                    entry = self._pending.popleft()
+                    batch.append(entry)
+                    size += entry[1]
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            live = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+            if not live:
+                continue
+            try:
+                outputs = self.run_batch([item for item, _, _ in live])
+            except Exception as e:
+                for _, _, f in live:
+                    f.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += sum(frames for _, frames, _ in live)
+            for (_, _, f), out in zip(live, outputs):
+                f.set_result(out)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "frames": self.frames,
+            "mean_batch_occupancy": (self.frames / (self.batches * self.max_batch)) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
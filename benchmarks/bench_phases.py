@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Phase-level microbenchmarks for the MuseTalk wrapper and API server.
+
+Runs against the stub MuseTalk tree in benchmarks/stub_musetalk (subprocess
+backend, no GPU or model weights needed) and times each phase between
+create_lipsync receiving bytes and send_file returning:
+
+    upload_spooling, temp_files, yaml_generation, process_spawn, inference,
+    output_discovery, output_discovery_glob, response_streaming, end_to_end
+
+Usage:
+    python benchmarks/bench_phases.py --iterations 20 --output bench_results.json
+    python benchmarks/bench_phases.py --compare old_results.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from glob import glob
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+STUB_MUSETALK = BENCH_DIR / "stub_musetalk"
+AVATAR_VIDEO = REPO_ROOT / "assets" / "avatar_video.mp4"
+
+
+def configure_environment(work_dir: Path) -> None:
+    """Point the wrapper at the stub before it is imported (config is read at import time)."""
+    os.environ["MUSETALK_PATH"] = str(STUB_MUSETALK)
+    os.environ["MUSETALK_BACKEND"] = "subprocess"
+    os.environ["AVATAR_VIDEO_PATH"] = str(AVATAR_VIDEO)
+    os.environ["PYTHON_ENV"] = sys.executable
+    os.environ["TEMP_DIR"] = str(work_dir / "results")
+    os.environ["JOB_DIR"] = str(work_dir / "jobs")
+    os.environ["AVATAR_CACHE_DIR"] = str(work_dir / "avatar_cache")
+    os.environ["AVATAR_DIR"] = str(work_dir / "avatars")
+    os.environ["RESULT_DIR"] = str(work_dir / "lipsync_results")
+    os.environ["FEATURE_CACHE_BYTES"] = "0"
+    # Caching would turn every iteration after the first into a hit
+    os.environ["RESULT_CACHE_BYTES"] = "0"
+    os.environ["STUB_TIMING_FILE"] = str(work_dir / "stub_timing.json")
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def summarize(samples: list) -> dict:
+    ms = sorted(s * 1000.0 for s in samples)
+    return {
+        "n": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": ms[len(ms) // 2],
+        "p95_ms": ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))],
+        "min_ms": ms[0],
+        "max_ms": ms[-1],
+    }
+
+
+def bench_upload_spooling(payload: bytes, work_dir: Path, iterations: int) -> list:
+    """Multipart parse + FileStorage.save, as create_lipsync does with request.files['audio']."""
+    from werkzeug.test import EnvironBuilder
+    from werkzeug.wrappers import Request
+
+    samples = []
+    dest = work_dir / "spooled.mp3"
+    for _ in range(iterations):
+        builder = EnvironBuilder(method="POST", data={"audio": (io.BytesIO(payload), "clip.mp3")})
+        environ = builder.get_environ()
+        t = time.perf_counter()
+        req = Request(environ)
+        req.files["audio"].save(str(dest))
+        samples.append(time.perf_counter() - t)
+        req.close()
+        builder.close()
+    return samples
+
+
+def bench_temp_files(payload: bytes, iterations: int) -> list:
+    """Create/write/unlink the audio and output NamedTemporaryFiles."""
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
+            temp_audio.write(payload)
+            audio_path = temp_audio.name
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_output:
+            output_path = temp_output.name
+        os.unlink(audio_path)
+        os.unlink(output_path)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def bench_yaml(wrapper, work_dir: Path, iterations: int) -> list:
+    samples = []
+    yaml_path = work_dir / "bench.yaml"
+    for _ in range(iterations):
+        t = time.perf_counter()
+        wrapper.make_temp_yaml("/tmp/audio.mp3", str(AVATAR_VIDEO), yaml_path)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def bench_process_spawn(wrapper, iterations: int) -> list:
+    """Bare interpreter start with the wrapper's cwd/env: the floor of any subprocess backend."""
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        subprocess.run([wrapper.PYTHON_ENV, "-c", "pass"], cwd=wrapper.MUSETALK_PATH,
+                       env=wrapper.CHILD_ENV, check=True)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def bench_wrapper_runs(wrapper, audio_path: str, work_dir: Path, iterations: int) -> dict:
+    """Full run_musetalk_subprocess calls; split into spawn, inference and output discovery."""
+    phases = {"subprocess_total": [], "inference": [], "spawn_and_teardown": [], "output_discovery": []}
+    timing_file = Path(os.environ["STUB_TIMING_FILE"])
+    for i in range(iterations):
+        output_path = str(work_dir / f"wrapper_out_{i}.mp4")
+        result = wrapper.run_musetalk_subprocess(audio_path, str(AVATAR_VIDEO), output_path)
+        if not result.get("success"):
+            raise RuntimeError(f"stub run failed: {json.dumps(result, default=str)[:2000]}")
+        timings = result["logs"]["timings"]
+        stub = json.loads(timing_file.read_text(encoding="utf-8"))
+        inference = stub["finished"] - stub["started"]
+        phases["subprocess_total"].append(timings["process"])
+        phases["inference"].append(inference)
+        phases["spawn_and_teardown"].append(max(0.0, timings["process"] - inference))
+        phases["output_discovery"].append(timings["output"])
+        os.unlink(output_path)
+    return phases
+
+
+def bench_output_glob(work_dir: Path, frames: int, iterations: int) -> list:
+    """The pre-scratch-dir discovery: recursive glob over a result dir full of frame PNGs."""
+    tree = work_dir / "glob_tree" / "v15"
+    frame_dir = tree / "avatar_video_audio"
+    frame_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(frames):
+        (frame_dir / f"{i:08d}.png").write_bytes(b"")
+    (tree / "output.mp4").write_bytes(b"\0" * 1024)
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        mp4s = sorted(glob(str(work_dir / "glob_tree" / "**" / "*.mp4"), recursive=True))
+        max(mp4s, key=lambda p: (Path(p).stat().st_size, Path(p).stat().st_mtime))
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def bench_response_streaming(api_server, video_path: str, iterations: int) -> list:
+    """send_file with create_lipsync's arguments, fully drained."""
+    from flask import send_file
+
+    samples = []
+    for _ in range(iterations):
+        with api_server.app.test_request_context("/lipsync", method="POST"):
+            t = time.perf_counter()
+            response = send_file(video_path, as_attachment=True,
+                                 download_name="lipsync_result.mp4", mimetype="video/mp4")
+            response.direct_passthrough = False
+            total = sum(len(chunk) for chunk in response.iter_encoded())
+            response.close()
+            samples.append(time.perf_counter() - t)
+        assert total == os.path.getsize(video_path)
+    return samples
+
+
+def bench_end_to_end(api_server, payload: bytes, iterations: int) -> list:
+    """POST /lipsync through the Flask test client with the stub backend."""
+    client = api_server.app.test_client()
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        response = client.post("/lipsync", data={"audio": (io.BytesIO(payload), "clip.mp3")},
+                               content_type="multipart/form-data")
+        body = response.get_data()
+        samples.append(time.perf_counter() - t)
+        if response.status_code != 200:
+            raise RuntimeError(f"/lipsync returned {response.status_code}: {body[:2000]!r}")
+    return samples
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\n{'phase':<24}{'baseline ms':>14}{'current ms':>14}{'ratio':>9}")
+    for phase, stats in current["phases"].items():
+        old = baseline.get("phases", {}).get(phase)
+        if not old:
+            print(f"{phase:<24}{'-':>14}{stats['mean_ms']:>14.3f}{'':>9}")
+            continue
+        ratio = stats["mean_ms"] / old["mean_ms"] if old["mean_ms"] else float("inf")
+        print(f"{phase:<24}{old['mean_ms']:>14.3f}{stats['mean_ms']:>14.3f}{ratio:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--audio-bytes", type=int, default=256 * 1024, help="size of the fake upload")
+    parser.add_argument("--glob-frames", type=int, default=750, help="frame files in the legacy glob tree")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="musetalk_bench_") as tmp:
+        work_dir = Path(tmp)
+        configure_environment(work_dir)
+        import musetalk_wrapper as wrapper
+
+        # Deterministic pseudo-audio: the stub never decodes it
+        payload = bytes(range(256)) * (args.audio_bytes // 256)
+        audio_path = work_dir / "audio.mp3"
+        audio_path.write_bytes(payload)
+
+        phases = {}
+        try:
+            phases["upload_spooling"] = bench_upload_spooling(payload, work_dir, args.iterations)
+        except ImportError as e:
+            print(f"skipping upload_spooling: {e}", file=sys.stderr)
+        phases["temp_files"] = bench_temp_files(payload, args.iterations)
+        phases["yaml_generation"] = bench_yaml(wrapper, work_dir, args.iterations)
+        phases["process_spawn"] = bench_process_spawn(wrapper, args.iterations)
+        phases.update(bench_wrapper_runs(wrapper, str(audio_path), work_dir, args.iterations))
+        phases["output_discovery_glob"] = bench_output_glob(work_dir, args.glob_frames, args.iterations)
+        try:
+            import api_server
+            phases["response_streaming"] = bench_response_streaming(api_server, str(AVATAR_VIDEO), args.iterations)
+            phases["end_to_end"] = bench_end_to_end(api_server, payload, args.iterations)
+        except ImportError as e:
+            print(f"skipping server phases: {e}", file=sys.stderr)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "iterations": args.iterations,
+            "audio_bytes": len(payload),
+            "glob_frames": args.glob_frames,
+            "stub_frames": int(os.environ.get("STUB_FRAMES", "50")),
+            "stub_frame_ms": float(os.environ.get("STUB_FRAME_MS", "2")),
+        },
+        "phases": {name: summarize(samples) for name, samples in phases.items()},
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    for name, stats in results["phases"].items():
+        print(f"{name:<24} mean {stats['mean_ms']:9.3f} ms   p95 {stats['p95_ms']:9.3f} ms")
+    print(f"\nwrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
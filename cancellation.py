@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Cancellation - cooperative stop flags for renders and teardown of the process groups they start
+"""
+
+import os
+import signal
+import subprocess
+import time
+
+# Seconds a process group gets between SIGTERM and SIGKILL
+KILL_GRACE_SECONDS = 2.0
+# How often a blocking wait looks at its cancel flag
+CANCEL_POLL_SECONDS = 0.2
+
+
+class Cancelled(Exception):
+    """The render's cancel event was set; whatever it started has been stopped."""
+
+    def __init__(self, message: str = "Cancelled"):
+        super().__init__(message)
+
+
+def check(cancel) -> None:
+    """Raise Cancelled if the (optional) threading.Event is set."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+def cancelled_result(**logs) -> dict:
+    return {"success": False, "error": "Cancelled", "cancelled": True, "logs": logs}
+
+
+def kill_group(proc, grace: float = KILL_GRACE_SECONDS) -> None:
+    """Stop proc and everything in its process group (started with start_new_session=True)."""
+    try:
+        pgid = os.getpgid(proc.pid)
+    except ProcessLookupError:
+        pgid = None
+    if pgid is None or pgid == os.getpgrp():
+        # Not in a group of its own: only the process itself can be signalled safely
+        proc.kill()
+        proc.wait()
+        return
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+        proc.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    except ProcessLookupError:
+        return
+    try:
+        # Children can outlive the leader; make sure the whole group is gone
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+def wait(proc, cancel, timeout: float) -> str:
+    """Wait for proc; "exited", or "cancelled" / "timeout" after its group has been killed."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            proc.wait(timeout=max(0.0, min(remaining, CANCEL_POLL_SECONDS if cancel is not None else remaining)))
+            return "exited"
+        except subprocess.TimeoutExpired:
+            pass
+        if cancel is not None and cancel.is_set():
+            kill_group(proc)
+            return "cancelled"
+        if time.monotonic() >= deadline:
+            kill_group(proc)
+            return "timeout"
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Disk LRU Cache - content-addressed files on local disk under a byte budget
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class DiskLRUCache:
+    """One file per key; least recently used entries are evicted once max_bytes is exceeded.
+
+    Recency survives restarts through file mtimes, which are bumped on every hit.
+    """
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = ""):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._bytes = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        entries = []
+        stale_before = time.time() - 3600
+        for p in self.root.iterdir():
+            if not p.is_file():
+                continue
+            if p.name.startswith("."):
+                # Leftover staging file from a crashed writer
+                try:
+                    if p.stat().st_mtime < stale_before:
+                        p.unlink()
+                except OSError:
+                    pass
+                continue
+            if self.suffix and not p.name.endswith(self.suffix):
+                continue
+            st = p.stat()
+            entries.append((st.st_mtime, p.name[:len(p.name) - len(self.suffix)], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached file (marking it most recently used), or None on a miss."""
+        with self._lock:
+            size = self._index.get(key)
+            if size is None:
+                self.misses += 1
+                return None
+            path = self.path(key)
+            if not path.exists():
+                # Removed behind our back
+                del self._index[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            self.bytes_served += size
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put_file(self, key: str, src: str) -> Optional[Path]:
+        """Copy src into the cache under key; returns the cached path (None if too large)."""
+        size = os.path.getsize(src)
+        if size > self.max_bytes:
+            return None
+        staging = self.root / f".{key}.{uuid.uuid4().hex}"
+        shutil.copyfile(src, staging)
+        return self._commit(key, staging, size)
+
+    def staging_path(self, key: str) -> Path:
+        """Temporary path to write a new entry into before commit()."""
+        return self.root / f".{key}.{uuid.uuid4().hex}{self.suffix}"
+
+    def commit(self, key: str, staging: Path) -> Optional[Path]:
+        """Atomically publish a file written at staging_path()."""
+        size = staging.stat().st_size
+        if size > self.max_bytes:
+            staging.unlink(missing_ok=True)
+            return None
+        return self._commit(key, staging, size)
+
+    def _commit(self, key: str, staging: Path, size: int) -> Path:
+        final = self.path(key)
+        os.replace(staging, final)
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old
+            self._index[key] = size
+            self._bytes += size
+            self._evict_locked()
+        return final
+
+    def _evict_locked(self) -> None:
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                self.path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "bytes_served": self.bytes_served,
+            }
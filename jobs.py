@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Job Manager - asynchronous lip sync jobs served by a bounded pool of worker threads, shortest job first
+"""
+
+import heapq
+import itertools
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+import metrics
+from progress import JobProgress
+
+JOB_WORKERS     = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_DIR         = os.environ.get("JOB_DIR", "/tmp/jobs")
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "3600"))
+# Admission control: submissions beyond either limit are refused with a retry estimate
+JOB_MAX_QUEUE          = int(os.environ.get("JOB_MAX_QUEUE", "32"))
+JOB_MAX_QUEUED_SECONDS = float(os.environ.get("JOB_MAX_QUEUED_SECONDS", "900"))
+# Audio seconds one worker renders per wall second, assumed until jobs have been measured
+JOB_DEFAULT_SPEED = float(os.environ.get("JOB_DEFAULT_SPEED", "0.5"))
+# Weight of the newest job in the throughput moving averages
+SPEED_SMOOTHING = 0.2
+# Scheduling: a waiting job gains JOB_AGING_RATE cost-seconds of priority per second waited, and
+# batch jobs start JOB_BATCH_PENALTY cost-seconds behind interactive ones
+JOB_AGING_RATE    = float(os.environ.get("JOB_AGING_RATE", "1.0"))
+JOB_BATCH_PENALTY = float(os.environ.get("JOB_BATCH_PENALTY", "120"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+INTERACTIVE, BATCH = "interactive", "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class QueueFull(Exception):
+    """Raised by submit when admitting the job would exceed a queue limit."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    id: str
+    dir: Path
+    audio_path: str
+    image_path: str
+    output_path: str
+    audio_seconds: float = 0.0
+    priority: str = INTERACTIVE
+    cost: float = 0.0
+    status: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    details: Optional[dict] = None
+    result_id: Optional[str] = None
+    # Set to stop the job; the runner watches it while rendering
+    cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    # Stage, counters and ETA, fed by the runner
+    progress: JobProgress = field(default_factory=JobProgress, repr=False)
+    # Resolves to the job itself once it is DONE, FAILED or CANCELLED
+    future: Future = field(default_factory=Future, repr=False)
+
+    def to_dict(self) -> dict:
+        info = {
+            "job_id": self.id,
+            "status": self.status,
+            "audio_seconds": self.audio_seconds,
+            "priority": self.priority,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.started is not None:
+            info["queue_seconds"] = self.started - self.created
+        if self.finished is not None and self.started is not None:
+            info["run_seconds"] = self.finished - self.started
+        if self.result_id is not None:
+            info["result_id"] = self.result_id
+        if self.status in (QUEUED, RUNNING):
+            info["progress"] = self.progress.snapshot()
+        if self.status == FAILED:
+            info["error"] = self.error
+            info["details"] = self.details
+        return info
+
+    def event(self) -> tuple:
+        """(name, data) for a progress stream: the final status once finished, else progress or stalled."""
+        info = self.to_dict()
+        if self.status in (DONE, FAILED, CANCELLED):
+            return self.status, info
+        return ("stalled" if info["progress"]["stalled"] else "progress"), info
+
+
+def _smooth(average: Optional[float], sample: float) -> float:
+    return sample if average is None else SPEED_SMOOTHING * sample + (1 - SPEED_SMOOTHING) * average
+
+
+class JobManager:
+    """Job queue drained by a fixed number of workers, each calling runner(audio, image, output, cancel, progress).
+
+    progress is a callback taking ProgressParser-style events; job.progress
+    turns them into the live stage, counters and ETA.
+
+    measure(audio_path) gives a clip's duration in seconds. Admission is refused
+    once max_queue jobs are waiting or the queued and running audio exceeds
+    max_queued_seconds; a lone job longer than that is still let into an empty
+    queue. Retry-After estimates come from that backlog and the measured speed.
+
+    Waiting jobs run cheapest first: estimate(image_path, audio_seconds) gives a
+    job's cost, batch jobs add batch_penalty, and every second spent waiting takes
+    aging_rate off. All jobs age alike, so the order is fixed at submit time, and
+    later arrivals can only overtake a job for (cost + penalty) / aging_rate seconds.
+    """
+
+    def __init__(self, runner: Callable[[str, str, str], dict], workers: int = JOB_WORKERS,
+                 job_dir: str = JOB_DIR, ttl_seconds: float = JOB_TTL_SECONDS,
+                 measure: Callable[[str], float] = None, max_queue: int = JOB_MAX_QUEUE,
+                 max_queued_seconds: float = JOB_MAX_QUEUED_SECONDS,
+                 estimate: Callable[[str, float], float] = None, aging_rate: float = JOB_AGING_RATE,
+                 batch_penalty: float = JOB_BATCH_PENALTY):
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.job_dir = Path(job_dir)
+        self.ttl_seconds = ttl_seconds
+        self.measure = measure
+        self.max_queue = max_queue
+        self.max_queued_seconds = max_queued_seconds
+        self.estimate = estimate
+        self.aging_rate = aging_rate
+        self.batch_penalty = batch_penalty
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._heap = []
+        self._seq = itertools.count()
+        self._threads = []
+        self._pending = 0
+        # Batches admitted with reserve=True, running outside the queue
+        self._reserved = 0
+        self._backlog_seconds = 0.0
+        self._speed = None
+        self._job_seconds = None
+        # Seconds each stage takes per audio second, from finished renders; feeds progress ETAs
+        self._stage_costs = {}
+
+    def start(self) -> None:
+        """Spawn the worker threads (idempotent; also done lazily by submit)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, audio_path: str, image_path: str, priority: str = INTERACTIVE) -> Job:
+        """Take ownership of audio_path (moved into the job dir) and enqueue the job.
+
+        Raises QueueFull, leaving audio_path in place, if the job is not admitted.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (expected one of {', '.join(PRIORITIES)})")
+        self.start()
+        self._expire()
+        audio_seconds = self.duration(audio_path)
+        self._admit(audio_seconds, queue=True)
+        try:
+            job = self._create(audio_path, image_path, audio_seconds)
+            job.priority = priority
+            job.cost = self._cost(image_path, audio_seconds)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._backlog_seconds = max(0.0, self._backlog_seconds - audio_seconds)
+            raise
+        rank = job.cost + (self.batch_penalty if priority == BATCH else 0.0) + self.aging_rate * job.created
+        with self._ready:
+            heapq.heappush(self._heap, (rank, next(self._seq), job.id))
+            self._ready.notify()
+        return job
+
+    def _cost(self, image_path: str, audio_seconds: float) -> float:
+        if self.estimate is None:
+            return audio_seconds
+        try:
+            return float(self.estimate(image_path, audio_seconds))
+        except Exception:
+            return audio_seconds
+
+    def _create(self, audio_path: str, image_path: str, audio_seconds: float) -> Job:
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        audio_dest = job_dir / ("audio" + Path(audio_path).suffix)
+        shutil.move(audio_path, audio_dest)
+        job = Job(
+            id=job_id,
+            dir=job_dir,
+            audio_path=str(audio_dest),
+            image_path=image_path,
+            output_path=str(job_dir / "result.mp4"),
+            audio_seconds=audio_seconds,
+            progress=JobProgress(audio_seconds),
+        )
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def duration(self, audio_path: str) -> float:
+        """Audio seconds as counted for admission (0 when unknown)."""
+        if self.measure is None:
+            return 0.0
+        try:
+            return max(0.0, float(self.measure(audio_path)))
+        except Exception:
+            # Unreadable audio fails in the renderer with a proper error; only the depth limit applies
+            return 0.0
+
+    def admit(self, audio_seconds: float, reserve: bool = False) -> None:
+        """Raise QueueFull if work of this length would not be admitted now.
+
+        reserve holds room for work that runs outside the queue (batches) until release().
+        """
+        self._admit(audio_seconds, reserve=reserve)
+
+    def _admit(self, audio_seconds: float, queue: bool = False, reserve: bool = False) -> None:
+        with self._lock:
+            limit = reason = None
+            if self.max_queue > 0 and self._pending + self._reserved >= self.max_queue:
+                reason = f"{self._pending} jobs already queued"
+                if self._reserved:
+                    reason += f", {self._reserved} batches running"
+                limit = "depth"
+            elif (self.max_queued_seconds > 0 and self._backlog_seconds > 0
+                  and self._backlog_seconds + audio_seconds > self.max_queued_seconds):
+                limit, reason = "audio_seconds", f"{self._backlog_seconds:.0f}s of audio already queued"
+            if limit is None:
+                if queue:
+                    self._pending += 1
+                if reserve:
+                    self._reserved += 1
+                if queue or reserve:
+                    self._backlog_seconds += audio_seconds
+                return
+            retry_after = self._retry_after()
+        metrics.ADMISSION_REJECTIONS.labels(limit).inc()
+        raise QueueFull(f"Server busy: {reason}", retry_after)
+
+    def release(self, audio_seconds: float) -> None:
+        """Give back the room held by admit(reserve=True)."""
+        with self._lock:
+            self._reserved -= 1
+            self._backlog_seconds = max(0.0, self._backlog_seconds - audio_seconds)
+
+    def _retry_after(self) -> int:
+        """Seconds until the workers should have drained the current backlog (lock held)."""
+        speed = self._speed or JOB_DEFAULT_SPEED
+        by_audio = self._backlog_seconds / (speed * self.workers)
+        # Covers jobs whose duration could not be measured
+        by_count = self._pending * (self._job_seconds or 0.0) / self.workers
+        return max(1, math.ceil(max(by_audio, by_count)))
+
+    def _queued_by_priority(self) -> dict:
+        counts = dict.fromkeys(PRIORITIES, 0)
+        for _, _, job_id in self._heap:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                counts[job.priority] += 1
+        return counts
+
+    def _record_speed(self, job: Job, cache_hit: bool = False) -> None:
+        """Fold a finished job into the moving averages behind Retry-After and ETAs (lock held)."""
+        elapsed = job.finished - job.started
+        if elapsed <= 0:
+            return
+        self._job_seconds = _smooth(self._job_seconds, elapsed)
+        if job.audio_seconds > 0:
+            self._speed = _smooth(self._speed, job.audio_seconds / elapsed)
+            if not cache_hit:
+                for stage, seconds in job.progress.stages.items():
+                    self._stage_costs[stage] = _smooth(self._stage_costs.get(stage), seconds / job.audio_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queue_depth(),
+                "queued_by_priority": self._queued_by_priority(),
+                "batches_running": self._reserved,
+                "backlog_audio_seconds": round(self._backlog_seconds, 3),
+                "max_queue": self.max_queue,
+                "max_queued_seconds": self.max_queued_seconds,
+                "speed": self._speed,
+                "job_seconds": self._job_seconds,
+                "drain_seconds": self._retry_after(),
+            }
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Stop a job: a queued one is dropped at once, a running one is interrupted by its runner.
+
+        Returns the job (None if unknown); it becomes CANCELLED once nothing of it runs any more.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel.set()
+            if job.status != QUEUED:
+                return job
+            self._heap = [entry for entry in self._heap if entry[2] != job_id]
+            heapq.heapify(self._heap)
+            self._pending -= 1
+            self._backlog_seconds = max(0.0, self._backlog_seconds - job.audio_seconds)
+            job.status = CANCELLED
+            job.finished = time.time()
+        job.progress.finish()
+        shutil.rmtree(job.dir, ignore_errors=True)
+        job.future.set_result(job)
+        return job
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job and delete its files now rather than at expiry."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            shutil.rmtree(job.dir, ignore_errors=True)
+
+    def queue_depth(self) -> int:
+        return self._pending
+
+    def stalled(self) -> int:
+        """Running jobs that have reported no progress for JOB_STALL_SECONDS."""
+        with self._lock:
+            running = [job for job in self._jobs.values() if job.status == RUNNING]
+        return sum(1 for job in running if job.progress.snapshot()["stalled"])
+
+    def backlog_seconds(self) -> float:
+        """Audio seconds of the queued and running jobs."""
+        return self._backlog_seconds
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._ready:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, job_id = heapq.heappop(self._heap)
+                self._pending -= 1
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                job.status = RUNNING
+                job.started = time.time()
+                job.progress.stage_costs = dict(self._stage_costs)
+                job.progress.expected_seconds = job.cost / (self._speed or JOB_DEFAULT_SPEED)
+            job.progress.start()
+            metrics.QUEUE_WAIT_SECONDS.labels(job.priority).observe(job.started - job.created)
+            try:
+                result = self.runner(job.audio_path, job.image_path, job.output_path, job.cancel,
+                                     job.progress.on_event)
+            except Exception as e:
+                result = {"success": False, "error": str(e), "logs": {"exception": repr(e)}}
+            job.finished = time.time()
+            if job.cancel.is_set():
+                job.status = CANCELLED
+            elif result.get("success"):
+                job.output_path = result.get("output", job.output_path)
+                job.result_id = result.get("result_id")
+                job.status = DONE
+            else:
+                job.error = result.get("error", "Unknown error")
+                job.details = result.get("logs")
+                job.status = FAILED
+            job.progress.finish()
+            with self._lock:
+                self._backlog_seconds = max(0.0, self._backlog_seconds - job.audio_seconds)
+                if job.status == DONE:
+                    self._record_speed(job, cache_hit=(result.get("logs") or {}).get("cache") == "hit")
+            if job.status == CANCELLED:
+                # Nothing of a cancelled job is kept but its record
+                shutil.rmtree(job.dir, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(job.audio_path)
+                except OSError:
+                    pass
+            job.future.set_result(job)
+
+    def _expire(self) -> None:
+        """Forget finished jobs (and their files) older than the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [j for j in self._jobs.values()
+                       if j.finished is not None and j.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.dir, ignore_errors=True)
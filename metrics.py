@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Metrics - minimal Prometheus text-format registry (counters, gauges, histograms)
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0, 600.0, math.inf)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Export label-less metrics as 0 from the start
+            self.labels()
+        registry.register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _label_str(self, key: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _items(self) -> list:
+        with self._lock:
+            return list(self._children.items())
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._fn = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, fn) -> None:
+        """Read the value from fn() at scrape time instead."""
+        self._fn = fn
+
+    def get(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return math.nan
+        with self._lock:
+            return self._value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> list:
+        return [f"{self.name}{self._label_str(key)} {_fmt(child.get())}" for key, child in self._items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, fn) -> None:
+        self.labels().set_function(fn)
+
+    @contextmanager
+    def track_inprogress(self, *labelvalues):
+        child = self.labels(*labelvalues)
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        t = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - t)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        buckets = tuple(sorted(buckets))
+        if buckets[-1] != math.inf:
+            buckets += (math.inf,)
+        self.buckets = buckets
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> list:
+        lines = []
+        for key, child in self._items():
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for upper, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{self._label_str(key, {'le': _fmt(upper)})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+        return lines
+
+
+# Service-wide metrics shared by the server, wrapper and engine
+REQUESTS = Counter("musetalk_http_requests_total", "HTTP requests by route, method and status.",
+                   ("route", "method", "status"))
+REQUEST_SECONDS = Histogram("musetalk_http_request_seconds", "Time to produce the HTTP response.", ("route",))
+JOBS_IN_FLIGHT = Gauge("musetalk_jobs_in_flight", "Renders currently executing.")
+QUEUE_DEPTH = Gauge("musetalk_queue_depth", "Jobs waiting for a worker.")
+QUEUE_WAIT_SECONDS = Histogram("musetalk_queue_wait_seconds", "Time from submit to a worker picking the job up.",
+                               ("priority",))
+QUEUE_AUDIO_SECONDS = Gauge("musetalk_queue_audio_seconds", "Audio seconds of queued and running jobs.")
+JOBS_STALLED = Gauge("musetalk_jobs_stalled", "Running jobs that have reported no progress for JOB_STALL_SECONDS.")
+ADMISSION_REJECTIONS = Counter("musetalk_admission_rejections_total", "Submissions refused with 429, by limit hit.",
+                               ("limit",))
+RENDERS = Counter("musetalk_renders_total", "Finished renders by backend and outcome.", ("backend", "outcome"))
+STAGE_SECONDS = Histogram("musetalk_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+RENDER_FPS = Histogram("musetalk_render_fps", "Output frames per second of wall time per render.", (),
+                       buckets=(1, 2, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 150))
+CACHE_HIT_RATIO = Gauge("musetalk_cache_hit_ratio", "Hit ratio per cache since start.", ("cache",))
+CACHE_HITS = Gauge("musetalk_cache_hits", "Cache hits since start.", ("cache",))
+CACHE_MISSES = Gauge("musetalk_cache_misses", "Cache misses since start.", ("cache",))
+CACHE_BYTES = Gauge("musetalk_cache_bytes", "Bytes currently held per cache.", ("cache",))
+STREAMS = Gauge("musetalk_streams", "Open WebSocket lip sync streams.")
+STREAM_FIRST_FRAME_SECONDS = Histogram("musetalk_stream_first_frame_seconds",
+                                       "Time from an utterance's first audio chunk to its first frame.")
+POOL_WORKERS = Gauge("musetalk_pool_workers", "Pooled worker processes by state.", ("state",))
+POOL_RECYCLES = Counter("musetalk_pool_recycles_total", "Pooled workers replaced, by reason (jobs, rss, crash, cancel).",
+                        ("reason",))
+SCRATCH_RESERVED_BYTES = Gauge("musetalk_scratch_reserved_bytes", "Scratch bytes reserved by running jobs.",
+                               ("tier",))
+SCRATCH_USED_BYTES = Gauge("musetalk_scratch_used_bytes", "Used bytes of the filesystem holding each scratch tier.",
+                           ("tier",))
+SCRATCH_JOBS = Counter("musetalk_scratch_jobs_total", "Scratch dirs handed out per tier.", ("tier",))
+SCRATCH_FALLBACKS = Counter("musetalk_scratch_fallbacks_total", "Jobs sent to disk because RAM scratch was full.")
+
+# Pipeline stages reported under musetalk_stage_seconds{stage=...}
+STAGES = ("audio_decode", "feature_extraction", "avatar_preparation", "unet", "vae_decode",
+          "blending", "encoding", "muxing")
+for _stage in STAGES:
+    STAGE_SECONDS.labels(_stage)
+
+
+_stage_recorders = []
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    for recorder in list(_stage_recorders):
+        recorder.append((stage, seconds))
+
+
+@contextmanager
+def record_stages():
+    """Also collect every (stage, seconds) observed in this process, from any thread, while active."""
+    recorder = []
+    _stage_recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _stage_recorders.remove(recorder)
+
+
+def watch_cache(name: str, stats_fn) -> None:
+    """Export a cache's stats() dict (hits, misses, hit_ratio, bytes) at scrape time."""
+    def field(key):
+        return lambda: (stats_fn() or {}).get(key, math.nan)
+    CACHE_HIT_RATIO.labels(name).set_function(field("hit_ratio"))
+    CACHE_HITS.labels(name).set_function(field("hits"))
+    CACHE_MISSES.labels(name).set_function(field("misses"))
+    CACHE_BYTES.labels(name).set_function(field("bytes"))
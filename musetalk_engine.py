@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+"""
+MuseTalk Engine - load the v15 models once and render many requests in-process
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from glob import glob
+from pathlib import Path
+from typing import Callable
+
+import cancellation
+from audio_utils import SAMPLE_RATE, audio_content_hash
+from avatar_cache import AvatarCache, HotAvatars, PreparedAvatar, AVATAR_CACHE_DIR, avatar_key, video_info
+from batching import MicroBatcher, MICROBATCH_MAX_SIZE
+from disk_cache import DiskLRUCache
+from metrics import RENDER_FPS, observe_stage
+from scratch import SCRATCH_JOB_BYTES, ScratchSpace
+
+# Inference defaults (mirror MuseTalk scripts/inference.py for v15)
+VAE_TYPE       = "sd-vae"
+WHISPER_DIR    = "models/whisper"
+BATCH_SIZE     = int(os.environ.get("MUSETALK_BATCH_SIZE", "8"))
+# Batches one render keeps queued in the micro-batcher: two merged passes' worth, so the GPU
+# never waits on it, while other renders' batches queue behind at most that much
+INFLIGHT_BATCHES = int(os.environ.get("MUSETALK_INFLIGHT_BATCHES",
+                                      str(2 * max(1, -(-MICROBATCH_MAX_SIZE // BATCH_SIZE)))))
+EXTRA_MARGIN   = 10
+PARSING_MODE   = "jaw"
+CHEEK_WIDTH    = 90
+AUDIO_PAD_LEFT = 2
+AUDIO_PAD_RIGHT = 2
+
+# Whisper chunk tensors per audio content hash, stored as fp16 .npy (0 disables)
+FEATURE_CACHE_DIR   = os.environ.get("FEATURE_CACHE_DIR", "/tmp/feature_cache")
+FEATURE_CACHE_BYTES = int(os.environ.get("FEATURE_CACHE_BYTES", str(512 * 1024 ** 2)))
+
+# How avatar frames repeat when the audio outlasts the video: "pingpong" (MuseTalk's) or "loop"
+AVATAR_PLAYBACK     = os.environ.get("AVATAR_PLAYBACK", "pingpong")
+# Avatar frames are prepared on demand, in steps of this many source frames
+AVATAR_PREPARE_STEP = int(os.environ.get("AVATAR_PREPARE_STEP", "50"))
+
+# Output encoding; part of the result cache key, so changing it invalidates cached renders
+ENCODE_ARGS = ("-c:v", "libx264", "-vf", "format=yuv420p", "-crf", "18", "-c:a", "aac")
+
+_cwd_lock = threading.Lock()
+
+
+def cycle_index(i: int, n: int, playback: str = AVATAR_PLAYBACK) -> int:
+    """Map output frame i onto n avatar frames, looped or played forward then backward."""
+    if playback == "loop":
+        return i % n
+    j = i % (2 * n)
+    return j if j < n else 2 * n - 1 - j
+
+
+def _covers(avatar, min_frames) -> bool:
+    if avatar is None:
+        return False
+    return avatar.complete or (min_frames is not None and len(avatar) >= min_frames)
+
+
+def _notify(progress, event: str, stage: str, **counters) -> None:
+    """Send a ProgressParser-style event to the optional progress callback."""
+    if progress is not None:
+        progress({"event": event, "stage": stage, **counters})
+
+
+def _counted(frames, report: Callable[[int], None]):
+    """Pass frames through, calling report(frames so far) every BATCH_SIZE frames and at the end."""
+    n = 0
+    for frame in frames:
+        yield frame
+        n += 1
+        if n % BATCH_SIZE == 0:
+            report(n)
+    report(n)
+
+
+@contextmanager
+def _musetalk_cwd(musetalk_path: Path):
+    """MuseTalk resolves several weights relative to cwd while importing/loading.
+
+    Only used once from MuseTalkEngine.load() (normally via warm_up before the
+    server starts handling requests); render paths never touch the cwd.
+    """
+    with _cwd_lock:
+        previous = os.getcwd()
+        os.chdir(musetalk_path)
+        try:
+            yield
+        finally:
+            os.chdir(previous)
+
+
+class MuseTalkEngine:
+    """Keeps UNet, VAE, whisper and face models resident between requests."""
+
+    def __init__(self, musetalk_path: str, unet_path: str, unet_config: str,
+                 version: str = "v15", ffmpeg_bin: str = "/usr/bin",
+                 temp_dir: str = "/tmp/results", use_float16: bool = True,
+                 avatar_cache_dir: str = AVATAR_CACHE_DIR,
+                 feature_cache_dir: str = FEATURE_CACHE_DIR, feature_cache_bytes: int = FEATURE_CACHE_BYTES,
+                 scratch: ScratchSpace = None):
+        self.root = Path(musetalk_path)
+        self.unet_path = unet_path
+        self.unet_config = unet_config
+        self.version = version
+        self.ffmpeg_bin = ffmpeg_bin
+        self.ffmpeg = str(Path(ffmpeg_bin) / "ffmpeg")
+        self.temp_dir = temp_dir
+        self.scratch = scratch or ScratchSpace(temp_dir)
+        self.use_float16 = use_float16
+        self.avatar_cache = AvatarCache(avatar_cache_dir)
+        self.hot_avatars = HotAvatars()
+        self.feature_cache = None
+        if feature_cache_bytes > 0:
+            self.feature_cache = DiskLRUCache(feature_cache_dir, feature_cache_bytes, suffix=".npy")
+        self.loaded = False
+        self.load_seconds = 0.0
+        self._load_lock = threading.Lock()
+        # One GPU, one set of modules: GPU work is serialized
+        self._run_lock = threading.Lock()
+        # One build or extension per avatar at a time, so concurrent renders don't duplicate it
+        self._prepare_locks = {}
+        self._prepare_locks_lock = threading.Lock()
+        # UNet + VAE decode for all concurrent renders goes through one batcher
+        self.batcher = MicroBatcher(self._run_merged)
+
+    def load(self) -> None:
+        """Import MuseTalk and move every model to the device (idempotent)."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            t0 = time.time()
+            if str(self.root) not in sys.path:
+                sys.path.insert(0, str(self.root))
+
+            with _musetalk_cwd(self.root):
+                import numpy as np
+                import cv2
+                import torch
+                from transformers import WhisperModel
+                from musetalk.utils.utils import load_all_model, get_video_fps
+                from musetalk.utils.audio_processor import AudioProcessor
+                from musetalk.utils.face_parsing import FaceParsing
+                from musetalk.utils.blending import get_image_prepare_material, get_image_blending
+                from musetalk.utils.preprocessing import get_landmark_and_bbox, coord_placeholder
+
+                device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                vae, unet, pe = load_all_model(
+                    unet_model_path=self.unet_path,
+                    vae_type=VAE_TYPE,
+                    unet_config=self.unet_config,
+                    device=device,
+                )
+                if self.use_float16:
+                    pe = pe.half()
+                    vae.vae = vae.vae.half()
+                    unet.model = unet.model.half()
+                pe = pe.to(device)
+                vae.vae = vae.vae.to(device)
+                unet.model = unet.model.to(device)
+
+                audio_processor = AudioProcessor(feature_extractor_path=WHISPER_DIR)
+                weight_dtype = unet.model.dtype
+                whisper = WhisperModel.from_pretrained(WHISPER_DIR)
+                whisper = whisper.to(device=device, dtype=weight_dtype).eval()
+                whisper.requires_grad_(False)
+
+                if self.version == "v15":
+                    fp = FaceParsing(left_cheek_width=CHEEK_WIDTH, right_cheek_width=CHEEK_WIDTH)
+                else:
+                    fp = FaceParsing()
+
+            self.np, self.cv2, self.torch = np, cv2, torch
+            self.get_video_fps = get_video_fps
+            self.get_image_prepare_material = get_image_prepare_material
+            self.get_image_blending = get_image_blending
+            self.get_landmark_and_bbox = get_landmark_and_bbox
+            self.coord_placeholder = coord_placeholder
+            self.device = device
+            self.vae, self.unet, self.pe = vae, unet, pe
+            self.audio_processor = audio_processor
+            self.whisper = whisper
+            self.weight_dtype = weight_dtype
+            self.fp = fp
+            self.timesteps = torch.tensor([0], device=device)
+
+            self.load_seconds = time.time() - t0
+            self.loaded = True
+
+    def _crop_box(self, bbox, frame) -> tuple:
+        x1, y1, x2, y2 = bbox
+        if self.version == "v15":
+            y2 = min(y2 + EXTRA_MARGIN, frame.shape[0])
+        return x1, y1, x2, y2
+
+    def _extract_frames(self, video_path: str, frames_dir: Path, start: int = 0, count: int = None) -> list:
+        """Decode source frames [start, start + count) into numbered PNGs (what get_landmark_and_bbox reads)."""
+        frames_dir.mkdir(parents=True, exist_ok=True)
+        cmd = [self.ffmpeg, "-v", "fatal", "-i", video_path]
+        if start:
+            cmd += ["-vf", f"select=gte(n\\,{start})", "-vsync", "0"]
+        if count is not None:
+            cmd += ["-frames:v", str(count)]
+        subprocess.run(cmd + ["-start_number", str(start), str(frames_dir / "%08d.png")], check=True)
+        return sorted(glob(str(frames_dir / "*.png")))
+
+    def _build_avatar(self, key: str, frame_paths: list, fps: float, bbox_shift: int,
+                      previous: PreparedAvatar = None, decoded: int = 0, complete: bool = True) -> PreparedAvatar:
+        """Prepare frame_paths, appended to previous (the already prepared prefix) if given.
+
+        Detection and VAE encoding take the GPU AVATAR_PREPARE_STEP frames at a time,
+        so renders and streams keep running while a long video is prepared.
+        """
+        np, cv2 = self.np, self.cv2
+        mode = PARSING_MODE if self.version == "v15" else "raw"
+        frames, coords, latents, masks, crop_boxes = [], [], [], [], []
+        if previous is not None:
+            frames.extend(previous.frames)
+            coords.extend(previous.coords)
+            latents.extend(previous.latents)
+            masks.extend(previous.mask(i) for i in range(len(previous)))
+            crop_boxes.extend(previous.crop_boxes)
+        for start in range(0, len(frame_paths), AVATAR_PREPARE_STEP):
+            with self._run_lock, self.torch.no_grad():
+                coord_list, frame_list = self.get_landmark_and_bbox(
+                    frame_paths[start:start + AVATAR_PREPARE_STEP], bbox_shift)
+                for bbox, frame in zip(coord_list, frame_list):
+                    # Frames without a detected face produce no output frame; drop them here
+                    if bbox == self.coord_placeholder:
+                        continue
+                    x1, y1, x2, y2 = self._crop_box(bbox, frame)
+                    crop = cv2.resize(frame[y1:y2, x1:x2], (256, 256), interpolation=cv2.INTER_LANCZOS4)
+                    latent = self.vae.get_latents_for_unet(crop)
+                    mask, crop_box = self.get_image_prepare_material(frame, [x1, y1, x2, y2], fp=self.fp, mode=mode)
+                    frames.append(frame)
+                    coords.append((x1, y1, x2, y2))
+                    latents.append(latent[0].float().cpu().numpy().astype(np.float16))
+                    masks.append(mask)
+                    crop_boxes.append(crop_box)
+        if not frames:
+            if complete:
+                raise RuntimeError("No face detected in avatar video")
+            return PreparedAvatar(key=key, fps=float(fps), frames=np.zeros((0, 1, 1, 3), np.uint8),
+                                  coords=np.zeros((0, 4), np.int32), latents=np.zeros((0, 1, 1, 1), np.float16),
+                                  masks=np.zeros((0, 1, 1), np.uint8), mask_shapes=np.zeros((0, 2), np.int32),
+                                  crop_boxes=np.zeros((0, 4), np.int32), decoded=decoded, complete=False)
+
+        mask_shapes = np.array([m.shape[:2] for m in masks], dtype=np.int32)
+        mask_h, mask_w = mask_shapes.max(axis=0)
+        padded = np.zeros((len(masks), mask_h, mask_w), dtype=np.uint8)
+        for i, m in enumerate(masks):
+            padded[i, :m.shape[0], :m.shape[1]] = m
+        return PreparedAvatar(
+            key=key,
+            fps=float(fps),
+            frames=np.stack(frames),
+            coords=np.array(coords, dtype=np.int32),
+            latents=np.stack(latents),
+            masks=padded,
+            mask_shapes=mask_shapes,
+            crop_boxes=np.array(crop_boxes, dtype=np.int32),
+            decoded=decoded,
+            complete=complete,
+        )
+
+    def _cached_avatar(self, key: str):
+        avatar = self.hot_avatars.get(key)
+        if avatar is None:
+            avatar = self.avatar_cache.load(key)
+            if avatar is not None:
+                avatar = self.hot_avatars.put(avatar)
+        return avatar
+
+    def _extend_avatar(self, key: str, video_path: str, bbox_shift: int, previous, min_frames) -> PreparedAvatar:
+        """Prepare the next run of source frames (the rest of the video when min_frames is None)."""
+        have = len(previous) if previous is not None else 0
+        start = previous.decoded if previous is not None else 0
+        count = None
+        if min_frames is not None:
+            steps = -(-max(min_frames - have, 1) // AVATAR_PREPARE_STEP)
+            count = steps * AVATAR_PREPARE_STEP
+        fps = previous.fps if previous is not None else self.get_video_fps(video_path)
+
+        with self.scratch.job(prefix="avatar_", estimate=self._frames_bytes(video_path, start, count)) as work_dir:
+            frame_paths = self._extract_frames(video_path, work_dir, start, count)
+            complete = count is None or len(frame_paths) < count
+            return self._build_avatar(key, frame_paths, fps, bbox_shift, previous,
+                                      decoded=start + len(frame_paths), complete=complete)
+
+    def _frames_bytes(self, video_path: str, start: int, count: int = None) -> int:
+        """Upper bound on the scratch taken by extracting count frames (None: the rest) from start."""
+        try:
+            _, total, width, height = video_info(video_path, self.ffmpeg_bin)
+        except Exception:
+            return SCRATCH_JOB_BYTES
+        frames = max(0, total - start) if count is None else min(count, max(0, total - start))
+        return max(1, frames) * width * height * 3
+
+    def avatar_fps(self, video_path: str, bbox_shift: int = 0) -> float:
+        self.load()
+        if self.version == "v15":
+            bbox_shift = 0
+        avatar = self._cached_avatar(avatar_key(video_path, bbox_shift, self.version, self.unet_path))
+        return avatar.fps if avatar is not None else float(self.get_video_fps(video_path))
+
+    def prepare_avatar(self, video_path: str, bbox_shift: int = 0, min_frames: int = None) -> PreparedAvatar:
+        """Return the avatar prepared for at least min_frames output frames (None: the whole video).
+
+        Only the prefix of the video a clip plays is decoded and prepared; a longer
+        clip later extends the cached prefix instead of starting over.
+        """
+        self.load()
+        if self.version == "v15":
+            bbox_shift = 0
+        key = avatar_key(video_path, bbox_shift, self.version, self.unet_path)
+        avatar = self._cached_avatar(key)
+        if _covers(avatar, min_frames):
+            return avatar
+        with self._prepare_locks_lock:
+            lock = self._prepare_locks.setdefault(key, threading.Lock())
+        with lock:
+            avatar = self._cached_avatar(key)
+            if _covers(avatar, min_frames):
+                return avatar
+            while not _covers(avatar, min_frames):
+                avatar = self._extend_avatar(key, video_path, bbox_shift, avatar, min_frames)
+            self.avatar_cache.save(avatar)
+            return self.hot_avatars.put(self.avatar_cache.load(key) or avatar)
+
+    def _feature_key(self, audio_hash: str, fps: float) -> str:
+        h = hashlib.sha256()
+        h.update(audio_hash.encode())
+        h.update(f"|fps={fps}|pad={AUDIO_PAD_LEFT},{AUDIO_PAD_RIGHT}|whisper={WHISPER_DIR}".encode())
+        return h.hexdigest()[:40]
+
+    def _audio_chunks(self, audio_path: str, fps: float, audio_hash: str = None):
+        """Whisper chunks for every output frame, served from the feature cache when possible."""
+        np, torch = self.np, self.torch
+        key = None
+        if self.feature_cache is not None:
+            if audio_hash is None:
+                audio_hash = audio_content_hash(audio_path, self.ffmpeg_bin)
+            key = self._feature_key(audio_hash, fps)
+            cached = self.feature_cache.get(key)
+            if cached is not None:
+                try:
+                    return torch.from_numpy(np.load(cached)).to(device=self.device, dtype=self.weight_dtype)
+                except (OSError, ValueError):
+                    pass
+
+        # Decoding and the mel spectrogram are CPU work; only the Whisper pass needs the GPU lock
+        t = time.time()
+        features, librosa_length = self.audio_processor.get_audio_feature(audio_path)
+        observe_stage("audio_decode", time.time() - t)
+        with self._run_lock, torch.no_grad():
+            t = time.time()
+            chunks = self.audio_processor.get_whisper_chunk(
+                features, self.device, self.weight_dtype, self.whisper, librosa_length,
+                fps=fps,
+                audio_padding_length_left=AUDIO_PAD_LEFT,
+                audio_padding_length_right=AUDIO_PAD_RIGHT,
+            )
+            self._sync()
+            observe_stage("feature_extraction", time.time() - t)
+
+        if key is not None:
+            staging = self.feature_cache.staging_path(key)
+            try:
+                with open(staging, "wb") as f:
+                    np.save(f, chunks.detach().to(torch.float16).cpu().numpy())
+                self.feature_cache.commit(key, staging)
+            except OSError:
+                staging.unlink(missing_ok=True)
+        return chunks
+
+    def pcm_chunks(self, pcm, fps: float):
+        """Whisper chunks for each output frame of 16 kHz mono float PCM held in memory (at most 30 s)."""
+        torch = self.torch
+        t = time.time()
+        features = self.audio_processor.feature_extractor(
+            pcm, return_tensors="pt", sampling_rate=SAMPLE_RATE).input_features
+        with self._run_lock, torch.no_grad():
+            chunks = self.audio_processor.get_whisper_chunk(
+                [features], self.device, self.weight_dtype, self.whisper, len(pcm),
+                fps=fps,
+                audio_padding_length_left=AUDIO_PAD_LEFT,
+                audio_padding_length_right=AUDIO_PAD_RIGHT,
+            )
+            self._sync()
+            observe_stage("feature_extraction", time.time() - t)
+        return chunks
+
+    def render_frames(self, chunks, avatar: PreparedAvatar, start: int = 0,
+                      cancel: threading.Event = None):
+        """Yield blended BGR frames for whisper chunks, continuing avatar playback at position start.
+
+        The entry point for streaming, which renders an utterance a window at a time.
+        """
+        n = len(avatar)
+        order = [cycle_index(start + k, n) for k in range(len(chunks))]
+        res_frames = self._infer_many([(chunks, self._latents_for(avatar, order))], cancel)[0]
+        yield from self._blend(res_frames, avatar, start=start)
+
+    def feature_cache_stats(self):
+        if self.feature_cache is None:
+            return None
+        stats = self.feature_cache.stats()
+        stats["bytes_saved"] = stats["bytes_served"]
+        return stats
+
+    def _latent_cycle(self, avatar: PreparedAvatar, frames: int) -> list:
+        """Latents for one playback period, truncated to the frames a clip plays; only those reach the GPU."""
+        n = len(avatar)
+        period = n if AVATAR_PLAYBACK == "loop" else 2 * n
+        return self._latents_for(avatar, [cycle_index(i, n) for i in range(min(frames, period))])
+
+    def _latents_for(self, avatar: PreparedAvatar, order: list) -> list:
+        """Latents of the given avatar frames, moved to the device."""
+        latents = self.torch.from_numpy(self.np.array(avatar.latents[:max(order) + 1]))
+        latents = latents.to(device=self.device, dtype=self.weight_dtype)
+        return [latents[j].unsqueeze(0) for j in order]
+
+    def _sync(self) -> None:
+        """Wait for queued CUDA work so stage timings are real."""
+        if self.device.type == "cuda":
+            self.torch.cuda.synchronize()
+
+    def _run_merged(self, items: list) -> list:
+        """One UNet + VAE decode pass over several (whisper, latent) batches, split back per item."""
+        torch = self.torch
+        sizes = [len(latent_batch) for _, latent_batch in items]
+        with self._run_lock, torch.no_grad():
+            whisper_batch = torch.cat([w for w, _ in items]).to(self.device)
+            latent_batch = torch.cat([lat for _, lat in items]).to(device=self.device, dtype=self.unet.model.dtype)
+            t = time.time()
+            audio_feature_batch = self.pe(whisper_batch)
+            pred_latents = self.unet.model(latent_batch, self.timesteps,
+                                           encoder_hidden_states=audio_feature_batch).sample
+            self._sync()
+            observe_stage("unet", time.time() - t)
+            t = time.time()
+            recon = self.vae.decode_latents(pred_latents)
+            observe_stage("vae_decode", time.time() - t)
+        outputs, start = [], 0
+        for n in sizes:
+            outputs.append(recon[start:start + n])
+            start += n
+        return outputs
+
+    def _infer_many(self, clips: list, cancel: threading.Event = None,
+                    progress: Callable[[dict], None] = None) -> list:
+        """UNet frames for several (whisper_chunks, latent_cycle) clips, packed into shared batches.
+
+        Batches run across clip boundaries so only the very last one is partial; the
+        batcher may merge them further with other jobs' batches. Only INFLIGHT_BATCHES
+        are queued at a time, so a long render cannot hold short ones up behind all of
+        its work. On cancel, batches that have not reached the GPU yet are withdrawn.
+        progress gets a unet event per batch.
+        """
+        torch = self.torch
+
+        def batches():
+            whisper_buf, latent_buf, owners = [], [], []
+            for clip_index, (whisper_chunks, latent_cycle) in enumerate(clips):
+                for i in range(len(whisper_chunks)):
+                    whisper_buf.append(whisper_chunks[i])
+                    latent_buf.append(latent_cycle[i % len(latent_cycle)])
+                    owners.append(clip_index)
+                    if len(latent_buf) >= BATCH_SIZE:
+                        yield (torch.stack(whisper_buf), torch.cat(latent_buf)), owners
+                        whisper_buf, latent_buf, owners = [], [], []
+            if latent_buf:
+                yield (torch.stack(whisper_buf), torch.cat(latent_buf)), owners
+
+        res_frames = [[] for _ in clips]
+        total = sum(len(whisper_chunks) for whisper_chunks, _ in clips)
+        done = 0
+        pending = batches()
+        window = deque()
+        while True:
+            while len(window) < max(1, INFLIGHT_BATCHES):
+                item = next(pending, None)
+                if item is None:
+                    break
+                window.append((self.batcher.submit(item[0], len(item[1])), item[1]))
+            if not window:
+                return res_frames
+            future, batch_owners = window[0]
+            for frame, clip_index in zip(self._batch_result(future, cancel, list(window)), batch_owners):
+                res_frames[clip_index].append(frame)
+            window.popleft()
+            done += len(batch_owners)
+            _notify(progress, "progress", "unet", done=done, total=total)
+
+    @staticmethod
+    def _batch_result(future, cancel, remaining: list):
+        if cancel is None:
+            return future.result()
+        while True:
+            if cancel.is_set():
+                for pending, _ in remaining:
+                    pending.cancel()
+                raise cancellation.Cancelled()
+            try:
+                return future.result(timeout=cancellation.CANCEL_POLL_SECONDS)
+            except FutureTimeout:
+                pass
+
+    def _blend(self, res_frames: list, avatar: PreparedAvatar, start: int = 0):
+        """Yield output frames with the generated mouths pasted back using the cached parsing masks (CPU only).
+
+        start is the playback position of res_frames[0], for renders that continue earlier ones.
+        """
+        np, cv2 = self.np, self.cv2
+        for i, res_frame in enumerate(res_frames):
+            j = cycle_index(start + i, len(avatar))
+            x1, y1, x2, y2 = avatar.coords[j].tolist()
+            ori_frame = np.array(avatar.frames[j])
+            try:
+                res_frame = cv2.resize(res_frame.astype(np.uint8), (x2 - x1, y2 - y1))
+            except Exception:
+                continue
+            yield self.get_image_blending(ori_frame, res_frame, [x1, y1, x2, y2],
+                                          np.array(avatar.mask(j)), avatar.crop_boxes[j].tolist())
+
+    def _encode(self, frames, size: tuple, audio_path: str, fps: float, output_path: str, work_dir: Path,
+                timings: dict, cancel: threading.Event = None) -> int:
+        """Pipe raw BGR frames into one ffmpeg that encodes H.264 and muxes the audio in the same pass.
+
+        Blending runs here, in step with the encoder: no frame images, no temp video,
+        no second read. Returns the number of frames written.
+        """
+        width, height = size
+        cmd = [self.ffmpeg, "-y", "-v", "warning",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-i", audio_path,
+               "-map", "0:v:0", "-map", "1:a:0",
+               *ENCODE_ARGS, output_path]
+        log_path = work_dir / "ffmpeg.log"
+        written = 0
+        blending = 0.0
+        t = time.time()
+        with open(log_path, "wb") as log:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log,
+                                    start_new_session=True)
+            try:
+                frames = iter(frames)
+                while True:
+                    cancellation.check(cancel)
+                    tb = time.time()
+                    frame = next(frames, None)
+                    blending += time.time() - tb
+                    if frame is None:
+                        break
+                    proc.stdin.write(self.np.ascontiguousarray(frame).data)
+                    written += 1
+                proc.stdin.close()
+            except BrokenPipeError:
+                # ffmpeg exited early; its return code and log say why
+                pass
+            except BaseException:
+                cancellation.kill_group(proc)
+                raise
+            finally:
+                returncode = proc.wait()
+        timings["blending"] = blending
+        timings["encoding"] = time.time() - t - blending
+        observe_stage("blending", timings["blending"])
+        observe_stage("encoding", timings["encoding"])
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=log_path.read_bytes())
+        return written
+
+    def _finish(self, res_frames: list, avatar: PreparedAvatar, audio_path: str, output_path: str,
+                clip_dir: Path, timings: dict, cancel: threading.Event = None,
+                report: Callable[[int], None] = None) -> dict:
+        """Blend and encode one clip's generated frames into output_path; report(n) follows the frames written."""
+        try:
+            size = (avatar.frames.shape[2], avatar.frames.shape[1])
+            frames = self._blend(res_frames, avatar)
+            if report is not None:
+                frames = _counted(frames, report)
+            written = self._encode(frames, size, audio_path, avatar.fps, output_path, clip_dir, timings, cancel)
+
+            elapsed = sum(timings.values())
+            render_fps = written / elapsed if elapsed else None
+            if render_fps:
+                RENDER_FPS.observe(render_fps)
+            return {
+                "success": True,
+                "output": output_path,
+                "logs": {"backend": "engine", "frames": written, "fps": avatar.fps,
+                         "render_fps": render_fps, "timings": timings},
+            }
+        except cancellation.Cancelled:
+            raise
+        except subprocess.CalledProcessError as e:
+            stderr = (e.stderr or b"").decode("utf-8", errors="ignore")[-4000:]
+            return {"success": False, "error": "ffmpeg failed", "logs": {"exception": repr(e), "stderr_tail": stderr}}
+        except Exception as e:
+            return {"success": False, "error": str(e), "logs": {"exception": repr(e), "timings": timings}}
+
+    def render_many(self, clips: list, video_path: str, bbox_shift: int = 0,
+                    cancel: threading.Event = None, progress: Callable[[dict], None] = None) -> list:
+        """Render several clips over one avatar, preparing it once and sharing UNet batches.
+
+        clips holds (audio_path, output_path, audio_hash_or_None) tuples; one result
+        dict is returned per clip, in the same order. Setting cancel stops the
+        render between stages, batches or frames; unfinished clips come back cancelled.
+        progress receives stage events plus frame counters for unet and blending,
+        summed over all clips.
+        """
+        results = [None] * len(clips)
+        shared = {}
+        try:
+            self.load()
+            if self.version == "v15":
+                bbox_shift = 0
+
+            # Audio first: its length decides how much of the avatar has to be prepared
+            _notify(progress, "stage", "feature_extraction")
+            t = time.time()
+            fps = self.avatar_fps(video_path, bbox_shift)
+            chunks = {}
+            for i, (audio_path, _, audio_hash) in enumerate(clips):
+                try:
+                    chunks[i] = self._audio_chunks(audio_path, fps, audio_hash)
+                except Exception as e:
+                    results[i] = {"success": False, "error": str(e), "logs": {"exception": repr(e)}}
+            shared["audio_features"] = time.time() - t
+            live = sorted(chunks)
+            if not live:
+                return results
+            needed = max(1, max(len(chunks[i]) for i in live))
+
+            cancellation.check(cancel)
+            _notify(progress, "stage", "avatar_preparation")
+            t = time.time()
+            avatar = self.prepare_avatar(video_path, bbox_shift, min_frames=needed)
+            latent_cycle = self._latent_cycle(avatar, needed)
+            shared["avatar_prepare"] = time.time() - t
+            observe_stage("avatar_preparation", shared["avatar_prepare"])
+
+            cancellation.check(cancel)
+            total = sum(len(chunks[i]) for i in live)
+            _notify(progress, "progress", "unet", done=0, total=total)
+            t = time.time()
+            res_frames = self._infer_many([(chunks[i], latent_cycle) for i in live], cancel, progress)
+            shared["inference"] = time.time() - t
+
+            # Frames are piped straight into ffmpeg; scratch only holds its logs
+            _notify(progress, "progress", "blending", done=0, total=total)
+            blended = 0
+            with self.scratch.job(prefix="engine_", estimate=1 << 20) as work_dir:
+                for i, frames in zip(live, res_frames):
+                    audio_path, output_path, _ = clips[i]
+                    clip_dir = work_dir / f"clip_{i:04d}"
+                    clip_dir.mkdir()
+                    count = len(frames)
+
+                    def report(n, base=blended):
+                        _notify(progress, "progress", "blending", done=base + n, total=total)
+
+                    results[i] = self._finish(frames, avatar, audio_path, output_path, clip_dir, dict(shared),
+                                              cancel, report if progress is not None else None)
+                    blended += count
+                    # Free this clip's frames before blending the next one
+                    frames.clear()
+        except cancellation.Cancelled:
+            for i, result in enumerate(results):
+                if result is None:
+                    results[i] = cancellation.cancelled_result(backend="engine", timings=shared)
+        except Exception as e:
+            for i, result in enumerate(results):
+                if result is None:
+                    results[i] = {"success": False, "error": str(e), "logs": {"exception": repr(e), "timings": shared}}
+        return results
+
+    def render(self, audio_path: str, video_path: str, output_path: str, bbox_shift: int = 0,
+               audio_hash: str = None, cancel: threading.Event = None,
+               progress: Callable[[dict], None] = None) -> dict:
+        """Render one lip-synced MP4 for audio_path over the avatar video."""
+        return self.render_many([(audio_path, output_path, audio_hash)], video_path, bbox_shift, cancel,
+                                progress)[0]
@@ -5,22 +5,66 @@ MuseTalk Wrapper Script - robust run with temp YAML, explicit PATH, rich logs
 
 import sys
 import os
+import hashlib
 import json
+import math
+import shutil
 import subprocess
+import threading
 import time
+import uuid
 from pathlib import Path
-from glob import glob
+from typing import Callable, Optional
+
+from audio_utils import audio_content_hash, audio_duration
+import cancellation
+from avatar_cache import AVATAR_CACHE_DIR, AvatarCache, avatar_key, file_sha256, video_info
+from disk_cache import DiskLRUCache
+from metrics import JOBS_IN_FLIGHT, RENDERS, RENDER_FPS, observe_stage
+from process_logs import StreamTail, prune_logs
+from progress import ProgressParser
+from scratch import SCRATCH_JOB_BYTES, ScratchSpace
+from streaming import LipsyncStream
+from worker_pool import WorkerPool
+from musetalk_engine import MuseTalkEngine, AVATAR_PLAYBACK, AVATAR_PREPARE_STEP, ENCODE_ARGS
 
 # MuseTalk install paths - use environment variables for container deployment
 MUSETALK_PATH = os.environ.get("MUSETALK_PATH", "/app/MuseTalk")
 FFMPEG_BIN   = os.environ.get("FFMPEG_BIN", "/usr/bin")
 PYTHON_ENV   = os.environ.get("PYTHON_ENV", "python")
+TEMP_DIR     = os.environ.get("TEMP_DIR", "/tmp/results")
 
 # Models (MuseTalk 1.5) - use forward slashes for Linux
 UNET_PATH    = "models/musetalkV15/unet.pth"
 UNET_CONFIG  = "models/musetalkV15/musetalk.json"
 VERSION      = "v15"
 
+# "engine" keeps models resident in this process; "pool" keeps them in pre-spawned worker
+# processes (worker_pool.py); "subprocess" spawns scripts.inference per call
+BACKEND      = os.environ.get("MUSETALK_BACKEND", "engine")
+
+# Finished MP4s keyed by decoded-audio hash + avatar hash + render params (0 disables)
+RESULT_CACHE_DIR   = os.environ.get("RESULT_CACHE_DIR", "/tmp/result_cache")
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_BYTES", str(2 * 1024 ** 3)))
+
+# Subprocess backend: MuseTalk gets a lossless prefix of the avatar that just covers the clip
+AVATAR_PREFIX_DIR  = os.environ.get("AVATAR_PREFIX_DIR", os.path.join(AVATAR_CACHE_DIR, "prefixes"))
+
+# Preparing one avatar frame (face detection, parsing, VAE encode) costs about this many rendered frames
+AVATAR_PREPARE_COST = float(os.environ.get("AVATAR_PREPARE_COST", "3"))
+
+# Per-job scratch: RAM-backed when SCRATCH_RAM_DIR is set and its quota allows, TEMP_DIR otherwise
+scratch_space = ScratchSpace(TEMP_DIR)
+
+_engine = None
+_pool = None
+_engine_lock = threading.Lock()
+_result_cache = None
+
+
+# Fixed output name so each run's MP4 sits at a known path inside its scratch dir
+RESULT_NAME  = "output.mp4"
+
 
 def make_temp_yaml(audio_path: str, image_path: str, yaml_path: Path) -> None:
     """Create a valid MuseTalk normal-inference YAML with task_0 block."""
@@ -33,9 +77,26 @@ def make_temp_yaml(audio_path: str, image_path: str, yaml_path: Path) -> None:
         f"  video_path: \"{img}\"\n"
         f"  audio_path: \"{aud}\"\n"
         "  bbox_shift: 0\n"
+        f"  result_name: \"{RESULT_NAME}\"\n"
     )
     yaml_path.write_text(yaml_text, encoding="utf-8")
 
+def _build_child_env() -> dict:
+    """Environment for MuseTalk child processes; computed once, never written back to os.environ."""
+    env = os.environ.copy()
+    # Ensure ffmpeg is visible to the subprocess
+    env["PATH"] = FFMPEG_BIN + os.pathsep + env.get("PATH", "")
+    # Ensure UTF-8 for stdout/stderr to avoid Windows charmap encode issues
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["PYTHONUTF8"] = "1"
+    # scripts.inference prints its stage markers without flushing; unbuffered, ProgressParser sees them live
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+CHILD_ENV = _build_child_env()
+
+
 def check_required_weights() -> tuple[bool, str]:
     """Verify essential model files exist (e.g., sd-vae)."""
     sd_vae_bin = Path(MUSETALK_PATH) / "models" / "sd-vae" / "diffusion_pytorch_model.bin"
@@ -45,106 +106,446 @@ def check_required_weights() -> tuple[bool, str]:
     return False, str(sd_vae_bin)
 
 
-def run_musetalk(audio_path: str, image_path: str, output_path: str) -> dict:
+def get_engine() -> MuseTalkEngine:
+    """Return the process-wide engine (models load on first use or via warm_up)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MuseTalkEngine(
+                musetalk_path=MUSETALK_PATH,
+                unet_path=UNET_PATH,
+                unet_config=UNET_CONFIG,
+                version=VERSION,
+                ffmpeg_bin=FFMPEG_BIN,
+                temp_dir=TEMP_DIR,
+                scratch=scratch_space,
+            )
+        return _engine
+
+
+def get_pool() -> WorkerPool:
+    """Return the process-wide worker pool (workers spawn on first use or via warm_up)."""
+    global _pool
+    with _engine_lock:
+        if _pool is None:
+            _pool = WorkerPool(scratch=scratch_space)
+        return _pool
+
+
+def _renderer():
+    """Engine or worker pool; both take render()/render_many() with the same arguments."""
+    return get_pool() if BACKEND == "pool" else get_engine()
+
+
+def get_result_cache():
+    """Return the process-wide result cache, or None when RESULT_CACHE_BYTES is 0."""
+    global _result_cache
+    if RESULT_CACHE_BYTES <= 0:
+        return None
+    with _engine_lock:
+        if _result_cache is None:
+            _result_cache = DiskLRUCache(RESULT_CACHE_DIR, RESULT_CACHE_BYTES, suffix=".mp4")
+        return _result_cache
+
+
+def result_cache_key(audio_hash: str, image_path: str) -> str:
+    """Everything that determines the rendered bytes: audio content, avatar, model and options."""
+    h = hashlib.sha256()
+    h.update(audio_hash.encode())
+    h.update(avatar_key(image_path, 0, VERSION, UNET_PATH).encode())
+    h.update(f"|unet_config={UNET_CONFIG}|fp16=1|playback={AVATAR_PLAYBACK}".encode())
+    # The pool runs the engine, so both share entries; the subprocess backend encodes its own way
+    if BACKEND in ("engine", "pool"):
+        h.update(f"|renderer=engine|encode={' '.join(ENCODE_ARGS)}".encode())
+    else:
+        h.update(b"|renderer=subprocess")
+    return h.hexdigest()[:40]
+
+
+def _serve_cached(cache, key: str, dest: str) -> bool:
+    """Put the cached result for key at dest; False on a miss, including an entry evicted meanwhile."""
+    cached = cache.get(key)
+    if cached is None:
+        return False
     try:
-        # Ensure ffmpeg is visible to the subprocess
-        os.environ["PATH"] = FFMPEG_BIN + os.pathsep + os.environ.get("PATH", "")
+        _link_or_copy(cached, dest)
+    except FileNotFoundError:
+        return False
+    return True
 
-        # Work from MuseTalk directory
-        os.chdir(MUSETALK_PATH)
 
-        # Verify weights exist before long run
+def _link_or_copy(src: Path, dest: str) -> None:
+    """Hard-link a cached file into place (copy across filesystems)."""
+    if os.path.exists(dest):
+        os.unlink(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def cached_result(audio_path: str, image_path: str, output_path: str) -> Optional[dict]:
+    """The result-cache hit for this audio and avatar, placed at output_path; None on a miss or without a cache."""
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    try:
+        key = result_cache_key(audio_content_hash(audio_path, FFMPEG_BIN), image_path)
+    except Exception:
+        return None
+    if not _serve_cached(cache, key, output_path):
+        return None
+    RENDERS.labels(BACKEND, "cache_hit").inc()
+    return {"success": True, "output": output_path, "logs": {"cache": "hit", "cache_key": key}}
+
+
+def warm_up() -> dict:
+    """Load models ahead of the first request when running the engine or pool backend."""
+    if BACKEND not in ("engine", "pool"):
+        return {"success": True, "backend": BACKEND}
+    ok, missing = check_required_weights()
+    if not ok:
+        return {"success": False, "error": f"Missing required weight file: {missing}"}
+    if BACKEND == "pool":
+        pool = get_pool()
+        if not pool.wait_ready():
+            return {"success": False, "backend": BACKEND, "error": pool.last_error or "No worker became ready"}
+        return {"success": True, "backend": BACKEND, "pool": pool.stats()}
+    engine = get_engine()
+    engine.load()
+    return {"success": True, "backend": BACKEND, "load_seconds": engine.load_seconds}
+
+
+def prepare_avatar(video_path: str) -> dict:
+    """Preprocess an avatar video ahead of its first render (engine and pool backends)."""
+    if BACKEND not in ("engine", "pool"):
+        return {"success": True, "backend": BACKEND}
+    ok, missing = check_required_weights()
+    if not ok:
+        return {"success": False, "error": f"Missing required weight file: {missing}"}
+    if BACKEND == "pool":
+        # The avatar cache is on disk, so every worker picks up what one prepared
+        return get_pool().prepare_avatar(video_path)
+    avatar = get_engine().prepare_avatar(video_path)
+    return {"success": True, "frames": len(avatar), "fps": avatar.fps, "bytes": avatar.nbytes}
+
+
+def open_stream(video_path: str) -> LipsyncStream:
+    """Streaming session over an avatar, rendered by this process's engine (engine backend only)."""
+    if BACKEND != "engine":
+        raise RuntimeError(f"Streaming needs the engine backend (MUSETALK_BACKEND={BACKEND})")
+    ok, missing = check_required_weights()
+    if not ok:
+        raise RuntimeError(f"Missing required weight file: {missing}")
+    engine = get_engine()
+    engine.load()
+    # Streams have no known length, so the whole avatar is prepared (uploads already are)
+    return LipsyncStream(engine, engine.prepare_avatar(video_path))
+
+
+def _outcome(result: dict) -> str:
+    if result.get("cancelled"):
+        return "cancelled"
+    return "success" if result.get("success") else "failure"
+
+
+def run_musetalk(audio_path: str, image_path: str, output_path: str, cancel: threading.Event = None,
+                 progress: Callable[[dict], None] = None) -> dict:
+    """Render one clip; setting cancel stops the render (and any processes it started) early.
+
+    progress, if given, receives ProgressParser-style stage and counter events as the render runs.
+    """
+    with JOBS_IN_FLIGHT.track_inprogress():
+        result = _run_musetalk_cached(audio_path, image_path, output_path, cancel, progress)
+    if result.get("logs", {}).get("cache") == "hit":
+        outcome = "cache_hit"
+    else:
+        outcome = _outcome(result)
+    RENDERS.labels(BACKEND, outcome).inc()
+    return result
+
+
+def _run_musetalk_cached(audio_path: str, image_path: str, output_path: str,
+                         cancel: threading.Event = None, progress: Callable[[dict], None] = None) -> dict:
+    cache = get_result_cache()
+    key = None
+    audio_hash = None
+    if cache is not None:
+        try:
+            audio_hash = audio_content_hash(audio_path, FFMPEG_BIN)
+            key = result_cache_key(audio_hash, image_path)
+        except Exception:
+            # Undecodable input: let the render report the real error
+            key = None
+        if key and _serve_cached(cache, key, output_path):
+            return {"success": True, "output": output_path, "logs": {"cache": "hit", "cache_key": key}}
+
+    result = _render(audio_path, image_path, output_path, audio_hash, cancel, progress)
+
+    if key and result.get("success"):
+        try:
+            cache.put_file(key, result["output"])
+        except OSError:
+            pass
+        result.setdefault("logs", {}).update({"cache": "miss", "cache_key": key})
+    return result
+
+
+def run_musetalk_batch(audio_paths: list, image_path: str, output_dir: str, cancel: threading.Event = None) -> dict:
+    """Render many clips over one avatar; output i is written to output_dir/clip_<i>.mp4."""
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    outputs = [str(out_dir / f"clip_{i:03d}.mp4") for i in range(len(audio_paths))]
+    results = [None] * len(audio_paths)
+    cache = get_result_cache()
+    keys, hashes = {}, {}
+
+    if cache is not None:
+        for i, audio_path in enumerate(audio_paths):
+            try:
+                hashes[i] = audio_content_hash(audio_path, FFMPEG_BIN)
+                keys[i] = result_cache_key(hashes[i], image_path)
+            except Exception:
+                continue
+            if _serve_cached(cache, keys[i], outputs[i]):
+                results[i] = {"success": True, "output": outputs[i], "logs": {"cache": "hit", "cache_key": keys[i]}}
+
+    todo = [i for i in range(len(audio_paths)) if results[i] is None]
+    JOBS_IN_FLIGHT.inc()
+    try:
+        _render_batch(todo, audio_paths, image_path, outputs, hashes, results, cancel)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+    for i, result in enumerate(results):
+        outcome = "cache_hit" if i not in todo else _outcome(result)
+        RENDERS.labels(BACKEND, outcome).inc()
+
+    for i in todo:
+        if i in keys and results[i].get("success"):
+            try:
+                cache.put_file(keys[i], results[i]["output"])
+            except OSError:
+                pass
+            results[i].setdefault("logs", {}).update({"cache": "miss", "cache_key": keys[i]})
+
+    return {
+        "success": all(r.get("success") for r in results),
+        "results": results,
+    }
+
+
+def _render_batch(todo: list, audio_paths: list, image_path: str, outputs: list, hashes: dict,
+                  results: list, cancel: threading.Event = None) -> None:
+    """Fill results[i] for every index in todo."""
+    if not todo:
+        return
+    if BACKEND in ("engine", "pool"):
+        ok, missing = check_required_weights()
+        if not ok:
+            for i in todo:
+                results[i] = {"success": False, "error": f"Missing required weight file: {missing}"}
+            return
+        clips = [(audio_paths[i], outputs[i], hashes.get(i)) for i in todo]
+        for i, result in zip(todo, _renderer().render_many(clips, image_path, cancel=cancel)):
+            results[i] = result
+    else:
+        for i in todo:
+            results[i] = run_musetalk_subprocess(audio_paths[i], image_path, outputs[i], cancel)
+
+
+def _render(audio_path: str, image_path: str, output_path: str, audio_hash: str = None,
+            cancel: threading.Event = None, progress: Callable[[dict], None] = None) -> dict:
+    if BACKEND in ("engine", "pool"):
         ok, missing = check_required_weights()
         if not ok:
             return {"success": False, "error": f"Missing required weight file: {missing}"}
+        return _renderer().render(audio_path, image_path, output_path, audio_hash=audio_hash, cancel=cancel,
+                                  progress=progress)
+    return run_musetalk_subprocess(audio_path, image_path, output_path, cancel, progress)
+
 
-        # Use temp directory from environment variable or default
-        temp_dir = os.environ.get("TEMP_DIR", "/tmp/results")
-        result_dir = Path(temp_dir)
-        result_dir.mkdir(parents=True, exist_ok=True)
-
-        # Create temporary YAML (use consistent naming like our CMD tests)
-        temp_yaml = result_dir / "my_test.yaml"
-        make_temp_yaml(audio_path, image_path, temp_yaml)
-
-        cmd = [
-            PYTHON_ENV,
-            "-m", "scripts.inference",
-            "--inference_config", str(temp_yaml),
-            "--result_dir", str(result_dir),
-            "--unet_model_path", UNET_PATH,
-            "--unet_config", UNET_CONFIG,
-            "--version", VERSION,
-            "--ffmpeg_path", FFMPEG_BIN,
-            "--use_float16",
-        ]
-
-        # Ensure UTF-8 for stdout/stderr to avoid Windows charmap encode issues
-        env = os.environ.copy()
-        env["PYTHONIOENCODING"] = "utf-8"
-        env["PYTHONUTF8"] = "1"
-
-        proc = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=900,  # up to 15 min for first run on 3050
-            env=env,
-        )
-
-        # Persist raw logs to disk for offline inspection
+def probe_video(video_path: str) -> tuple[float, int]:
+    """(fps, frame count) of a video's first stream, memoized by content."""
+    fps, frames, _, _ = video_info(video_path, FFMPEG_BIN)
+    return fps, frames
+
+
+def render_cost(image_path: str, audio_seconds: float) -> float:
+    """Estimated work for a clip, in audio seconds: its length plus the avatar frames it must prepare first."""
+    try:
+        fps, total = probe_video(image_path)
+    except Exception:
+        return audio_seconds
+    needed = min(math.ceil(audio_seconds * fps) + 2, total)
+    ready = 0
+    if BACKEND in ("engine", "pool"):
+        # v1.5 ignores bbox_shift, so the engine's cache key always uses 0
+        meta = AvatarCache().meta(avatar_key(image_path, 0, VERSION, UNET_PATH))
+        if meta is not None:
+            ready = total if meta.get("complete") else meta.get("frames", 0)
+    # The subprocess backend prepares its avatar prefix again on every call
+    return audio_seconds + max(0, needed - ready) / fps * AVATAR_PREPARE_COST
+
+
+def avatar_prefix(image_path: str, audio_path: str) -> str:
+    """Path of an avatar clip just long enough for audio_path (image_path itself when that is shorter).
+
+    MuseTalk extracts, detects and encodes every frame of the video it is given;
+    frames past the end of the audio are never shown, so a prefix renders
+    identically. The prefix is re-encoded losslessly and cached per length step.
+    """
+    try:
+        fps, total = probe_video(image_path)
+        needed = math.ceil(audio_duration(audio_path, FFMPEG_BIN) * fps) + 2
+    except Exception:
+        return image_path
+    frames = -(-needed // AVATAR_PREPARE_STEP) * AVATAR_PREPARE_STEP
+    if frames >= total:
+        return image_path
+    dest = Path(AVATAR_PREFIX_DIR) / f"{file_sha256(image_path)[:16]}_{frames}.mp4"
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        staging = dest.with_name(f".{uuid.uuid4().hex}_{dest.name}")
         try:
-            (result_dir / "stdout.log").write_text(proc.stdout or "", encoding="utf-8", errors="ignore")
-            (result_dir / "stderr.log").write_text(proc.stderr or "", encoding="utf-8", errors="ignore")
-        except Exception:
-            pass
+            subprocess.run([str(Path(FFMPEG_BIN) / "ffmpeg"), "-y", "-v", "error", "-i", image_path,
+                            "-map", "0:v:0", "-frames:v", str(frames), "-c:v", "libx264", "-qp", "0",
+                            "-preset", "ultrafast", str(staging)], capture_output=True, check=True)
+            os.replace(staging, dest)
+        except (OSError, subprocess.CalledProcessError):
+            staging.unlink(missing_ok=True)
+            return image_path
+    return str(dest)
+
+
+def subprocess_scratch_bytes(image_path: str, audio_path: str) -> int:
+    """Upper bound on a subprocess render's scratch: one raw-sized image per avatar frame decoded and per frame made."""
+    try:
+        fps, total, width, height = video_info(image_path, FFMPEG_BIN)
+        generated = math.ceil(audio_duration(audio_path, FFMPEG_BIN) * fps) + 2
+    except Exception:
+        return SCRATCH_JOB_BYTES
+    decoded = min(total, -(-generated // AVATAR_PREPARE_STEP) * AVATAR_PREPARE_STEP)
+    return (decoded + generated) * width * height * 3
+
+
+def job_scratch(prefix: str = "job_", estimate: int = SCRATCH_JOB_BYTES):
+    """Private scratch directory for one invocation, removed on exit."""
+    return scratch_space.job(prefix=prefix, estimate=estimate)
+
 
-        run_logs = {
-            "cmd": cmd,
-            "cwd": MUSETALK_PATH,
-            "stdout": proc.stdout,            # full output for deep diagnostics
-            "stderr": proc.stderr,
-            "stdout_tail": proc.stdout[-4000:] if proc.stdout else "",
-            "stderr_tail": proc.stderr[-4000:] if proc.stderr else "",
-            "returncode": proc.returncode,
-            "result_dir": str(result_dir),
-        }
-
-        if proc.returncode != 0:
-            return {"success": False, "error": "MuseTalk returned non-zero", "logs": run_logs}
-
-        # Find an MP4 in result_dir (MuseTalk may choose name/dir)
-        mp4s = sorted(glob(str(result_dir / "**" / "*.mp4"), recursive=True))
-        if not mp4s:
-            # Try fallback search under MuseTalk default results directory
-            fallback_root = Path(MUSETALK_PATH) / "results"
-            fallback_mp4s = []
-            if fallback_root.exists():
-                fallback_mp4s = sorted(glob(str(fallback_root / "**" / "*.mp4"), recursive=True))
-
-            # Extend logs with directory listings to show in Network console
-            run_logs["result_dir_files"] = [str(p) for p in (result_dir.rglob("*")) if p.is_file()][:200]
-            if fallback_root.exists():
-                run_logs["fallback_results_root"] = str(fallback_root)
-                run_logs["fallback_results_files"] = [str(p) for p in (fallback_root.rglob("*.mp4"))][:200]
-
-            if fallback_mp4s:
-                best = max(fallback_mp4s, key=lambda p: (Path(p).stat().st_size, Path(p).stat().st_mtime))
-                # Copy/move the best fallback into our expected output
-                Path(best).replace(output_path)
-                return {"success": True, "output": output_path, "logs": run_logs}
-
-            return {"success": False, "error": "No MP4 found in result_dir", "logs": run_logs}
-
-        best = max(mp4s, key=lambda p: (Path(p).stat().st_size, Path(p).stat().st_mtime))
-
-        # Move to expected output_path
-        Path(best).replace(output_path)
-
-        return {"success": True, "output": output_path, "logs": run_logs}
-
-    except subprocess.TimeoutExpired as e:
-        return {"success": False, "error": "MuseTalk timeout expired", "logs": {"phase": "timeout", "exception": repr(e)}}
+def run_musetalk_subprocess(audio_path: str, image_path: str, output_path: str,
+                            cancel: threading.Event = None, progress: Callable[[dict], None] = None) -> dict:
+    run_id = uuid.uuid4().hex[:12]
+    try:
+        # Verify weights exist before long run
+        ok, missing = check_required_weights()
+        if not ok:
+            return {"success": False, "error": f"Missing required weight file: {missing}"}
+        cancellation.check(cancel)
+
+        estimate = subprocess_scratch_bytes(image_path, audio_path)
+        with job_scratch(prefix=f"job_{run_id}_", estimate=estimate) as scratch:
+            # inference.py writes its coord pickle to result_dir/../, so nest one level
+            # down to keep that file inside this run's scratch dir as well
+            result_dir = scratch / "out"
+            result_dir.mkdir()
+
+            timings = {}
+            t = time.time()
+            video_path = avatar_prefix(image_path, audio_path)
+            timings["avatar_prefix"] = time.time() - t
+            cancellation.check(cancel)
+
+            t = time.time()
+            temp_yaml = scratch / "inference.yaml"
+            make_temp_yaml(audio_path, video_path, temp_yaml)
+            timings["yaml"] = time.time() - t
+
+            cmd = [
+                PYTHON_ENV,
+                "-m", "scripts.inference",
+                "--inference_config", str(temp_yaml),
+                "--result_dir", str(result_dir),
+                "--unet_model_path", UNET_PATH,
+                "--unet_config", UNET_CONFIG,
+                "--version", VERSION,
+                "--ffmpeg_path", FFMPEG_BIN,
+                "--use_float16",
+            ]
+
+            # Child output streams straight to rotating per-run files; only a tail stays in memory
+            log_dir = Path(TEMP_DIR) / "logs"
+            prune_logs(log_dir)
+
+            # Explicit cwd/env per call: no process-wide chdir or PATH mutation
+            t = time.time()
+            proc = subprocess.Popen(
+                cmd,
+                # One pipe for both streams keeps stage markers and tqdm bars in write order
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                cwd=MUSETALK_PATH,
+                env=CHILD_ENV,
+                # Own process group, so cancel and timeout also reach the ffmpeg runs it starts
+                start_new_session=True,
+            )
+            # Markers (stdout) and tqdm bars (stderr) reach the parser in the order they were written
+            parser = ProgressParser(on_event=progress)
+            output = StreamTail(proc.stdout, log_dir / f"{run_id}.log", on_line=parser.feed)
+            # up to 15 min for first run on 3050
+            outcome = cancellation.wait(proc, cancel, timeout=900)
+            output.join()
+            timings["process"] = time.time() - t
+            summary = parser.finish()
+
+            run_logs = {
+                "run_id": run_id,
+                "cmd": cmd,
+                "cwd": MUSETALK_PATH,
+                "output_log": output.summary(),
+                "output_tail": output.tail_text(),
+                "returncode": proc.returncode,
+                "result_dir": str(result_dir),
+                "timings": timings,
+                "progress": summary,
+            }
+
+            if outcome == "cancelled":
+                run_logs["phase"] = "cancelled"
+                return cancellation.cancelled_result(**run_logs)
+
+            if outcome == "timeout":
+                run_logs["phase"] = "timeout"
+                return {"success": False, "error": "MuseTalk timeout expired", "logs": run_logs}
+
+            if proc.returncode != 0:
+                return {"success": False, "error": "MuseTalk returned non-zero", "logs": run_logs}
+
+            for stage, info in summary["stages"].items():
+                observe_stage(stage, info["seconds"])
+            if summary["fps"]:
+                RENDER_FPS.observe(summary["fps"])
+
+            # scripts.inference writes <result_dir>/<version>/<result_name>
+            t = time.time()
+            produced = result_dir / VERSION / RESULT_NAME
+            if not produced.is_file():
+                run_logs["result_dir_files"] = [str(p) for p in result_dir.rglob("*") if p.is_file()][:200]
+                return {"success": False, "error": f"Expected output not found: {produced}", "logs": run_logs}
+
+            # Move to expected output_path (copy if it lives on another filesystem)
+            shutil.move(str(produced), output_path)
+            timings["output"] = time.time() - t
+
+            return {"success": True, "output": output_path, "logs": run_logs}
+
+    except cancellation.Cancelled:
+        return cancellation.cancelled_result(run_id=run_id)
     except Exception as e:
         # best-effort: include any partial stdout/stderr if available
         return {"success": False, "error": str(e), "logs": {"exception": repr(e)}}
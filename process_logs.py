@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Process Logs - stream child output to rotating per-run files, keep only a bounded tail in memory
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Optional
+
+LOG_MAX_BYTES         = int(os.environ.get("LOG_MAX_BYTES", str(1024 * 1024)))
+LOG_BACKUPS           = int(os.environ.get("LOG_BACKUPS", "2"))
+LOG_TAIL_LINES        = int(os.environ.get("LOG_TAIL_LINES", "200"))
+LOG_RETENTION_SECONDS = float(os.environ.get("LOG_RETENTION_SECONDS", str(24 * 3600)))
+
+
+class RotatingLogFile:
+    """Append-only text file rolled over to .1, .2, ... once it exceeds max_bytes."""
+
+    def __init__(self, path: Path, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8", errors="replace")
+        self._size = self._f.tell()
+
+    def write(self, text: str) -> None:
+        if self._size + len(text) > self.max_bytes and self._size > 0:
+            self._rollover()
+        self._f.write(text)
+        self._size += len(text)
+
+    def _rollover(self) -> None:
+        self._f.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = self.path.with_name(f"{self.path.name}.{i}")
+                if src.exists():
+                    os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self._f = open(self.path, "w", encoding="utf-8", errors="replace")
+        self._size = 0
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class StreamTail:
+    """Drain a text pipe on a background thread into a RotatingLogFile plus a line ring buffer.
+
+    Pipes opened in text mode use universal newlines, so tqdm's carriage-return
+    updates arrive as separate lines.
+    """
+
+    def __init__(self, pipe, log_path: Path, tail_lines: int = LOG_TAIL_LINES,
+                 on_line: Optional[Callable[[str], None]] = None):
+        self.pipe = pipe
+        self.log = RotatingLogFile(log_path)
+        self.tail = deque(maxlen=tail_lines)
+        self.on_line = on_line
+        self.lines = 0
+        self.bytes = 0
+        self._thread = threading.Thread(target=self._drain, name=f"tail-{Path(log_path).name}", daemon=True)
+        self._thread.start()
+
+    def _drain(self) -> None:
+        try:
+            for line in iter(self.pipe.readline, ""):
+                self.lines += 1
+                self.bytes += len(line)
+                self.log.write(line)
+                stripped = line.rstrip("\n")
+                if stripped:
+                    self.tail.append(stripped)
+                if self.on_line is not None:
+                    try:
+                        self.on_line(stripped)
+                    except Exception:
+                        pass
+        finally:
+            self.log.close()
+            self.pipe.close()
+
+    def join(self, timeout: float = None) -> None:
+        self._thread.join(timeout)
+
+    def tail_text(self, max_chars: int = 4000) -> str:
+        return "\n".join(self.tail)[-max_chars:]
+
+    def summary(self) -> dict:
+        return {"lines": self.lines, "bytes": self.bytes, "log_file": str(self.log.path)}
+
+
+def prune_logs(log_dir: Path, max_age: float = LOG_RETENTION_SECONDS) -> None:
+    """Delete per-run log files (and their rotations) older than max_age seconds."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(Path(log_dir).iterdir())
+    except OSError:
+        return
+    for p in entries:
+        try:
+            if p.is_file() and p.stat().st_mtime < cutoff:
+                p.unlink()
+        except OSError:
+            pass
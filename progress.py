@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Progress - turn MuseTalk's printed markers and tqdm bars into structured stage timings, and track live job progress
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+# tqdm line, e.g. " 45%|████▌     | 9/20 [00:03<00:04,  2.61it/s]"
+_TQDM = re.compile(
+    r"(?P<n>\d+)/(?P<total>\d+)\s*\[(?P<elapsed>[\d:]+)<(?P<remaining>[\d:?]+)"
+    r"(?:,\s*(?P<rate>[\d.]+|\?)\s*(?P<unit>it/s|s/it))?"
+)
+
+# Printed markers in scripts.inference, in pipeline order
+_MARKERS = (
+    (re.compile(r"landmark|bounding box", re.I), "avatar_preparation"),
+    (re.compile(r"start(ing)? inference", re.I), "unet"),
+    (re.compile(r"pad(ding)?\b.*\b(talking|generated) image", re.I), "blending"),
+    (re.compile(r"img2video|image2|video generation", re.I), "encoding"),
+    (re.compile(r"combin\w* audio|audio combination", re.I), "muxing"),
+    (re.compile(r"results? (is )?sav(e|ed) to", re.I), "done"),
+)
+
+# If a tqdm bar starts without a marker, assume the usual order of bars
+_BAR_ORDER = ("avatar_preparation", "unet", "blending")
+
+# Stages either backend reports, in the order they run (a backend may skip some)
+STAGE_ORDER = ("starting", "feature_extraction", "avatar_preparation", "unet", "blending", "encoding", "muxing")
+
+# A running job that reports nothing for this long is flagged as stalled
+JOB_STALL_SECONDS = float(os.environ.get("JOB_STALL_SECONDS", "120"))
+# Progress streams repeat the latest state this often even when nothing changed
+PROGRESS_HEARTBEAT_SECONDS = float(os.environ.get("PROGRESS_HEARTBEAT_SECONDS", "5"))
+
+
+class ProgressParser:
+    """Feed lines as they arrive; read stage timings and a live snapshot at any time.
+
+    Markers and bars must arrive in the order the child wrote them, so feed it from a
+    single pipe carrying both streams. snapshot() is safe from other threads.
+    """
+
+    def __init__(self, on_event: Optional[Callable[[dict], None]] = None):
+        self.on_event = on_event
+        self.started = time.time()
+        self.stage = "starting"
+        self.stage_started = self.started
+        self.stages = {}
+        self.events = []
+        self.done = 0
+        self.total = 0
+        self.rate = 0.0
+        self.frames = 0
+        self._bars = 0
+        self._bar_total = None
+        self._bar_n = 0
+        self._bar_stage = self.stage
+        self._lock = threading.Lock()
+
+    def feed(self, line: str) -> None:
+        now = time.time()
+        with self._lock:
+            for pattern, stage in _MARKERS:
+                if pattern.search(line):
+                    self._enter(stage, now)
+                    break
+            m = _TQDM.search(line)
+            if m:
+                self._progress(m, now)
+
+    def _emit(self, event: dict) -> None:
+        if event["event"] == "stage":
+            self.events.append(event)
+        if self.on_event is not None:
+            try:
+                self.on_event(event)
+            except Exception:
+                pass
+
+    def _enter(self, stage: str, now: float) -> None:
+        if stage == self.stage:
+            return
+        self._close_stage(now)
+        self.stage = stage
+        self.stage_started = now
+        self.done, self.total, self.rate = 0, 0, 0.0
+        self._emit({"t": now - self.started, "event": "stage", "stage": stage})
+
+    def _close_stage(self, now: float) -> None:
+        if self.stage in ("starting", "done"):
+            return
+        info = self.stages.setdefault(self.stage, {"seconds": 0.0})
+        info["seconds"] += now - self.stage_started
+        if self.total:
+            info.update({"items": self.done, "total": self.total, "rate": self.rate})
+
+    def _progress(self, m, now: float) -> None:
+        n, total = int(m.group("n")), int(m.group("total"))
+        if total != self._bar_total or n < self._bar_n:
+            self._bars += 1
+            self._bar_total = total
+            # No marker since the previous bar: fall back to the usual order of bars
+            if self.stage == self._bar_stage and self._bars <= len(_BAR_ORDER):
+                self._enter(_BAR_ORDER[self._bars - 1], now)
+            self._bar_stage = self.stage
+        self._bar_n = n
+        rate = m.group("rate")
+        if rate and rate != "?":
+            self.rate = float(rate) if m.group("unit") == "it/s" else (1.0 / float(rate) if float(rate) else 0.0)
+        self.done, self.total = n, total
+        if self.stage == "blending":
+            self.frames = max(self.frames, n)
+        self._emit({"t": now - self.started, "event": "progress", "stage": self.stage,
+                    "done": n, "total": total, "rate": self.rate})
+
+    def snapshot(self) -> dict:
+        """Current stage, items done/total, rate and a rough ETA for that stage."""
+        with self._lock:
+            eta = None
+            if self.rate and self.total:
+                eta = max(0.0, (self.total - self.done) / self.rate)
+            return {
+                "stage": self.stage,
+                "done": self.done,
+                "total": self.total,
+                "rate": self.rate,
+                "elapsed": time.time() - self.started,
+                "stage_eta_seconds": eta,
+            }
+
+    def finish(self) -> dict:
+        """Close the running stage and return the structured summary."""
+        now = time.time()
+        with self._lock:
+            self._close_stage(now)
+            self.stage = "done"
+            elapsed = now - self.started
+            return {
+                "elapsed": elapsed,
+                "frames": self.frames,
+                "fps": (self.frames / elapsed) if self.frames and elapsed else None,
+                "stages": {name: dict(info) for name, info in self.stages.items()},
+                "events": list(self.events),
+            }
+
+
+class JobProgress:
+    """Live progress of one job, fed the same events ProgressParser emits.
+
+    Renderers call on_event({"event": "stage" | "progress", "stage", "done", "total"[, "rate"]})
+    from any thread; readers take snapshot() or block in wait() until the next change.
+    The ETA is the current stage's remaining items at its measured rate, plus what
+    the later stages took per audio second in earlier jobs (stage_costs). Until
+    there is such history it falls back to expected_seconds for the whole run.
+    """
+
+    def __init__(self, audio_seconds: float = 0.0, stage_costs: Optional[dict] = None,
+                 expected_seconds: Optional[float] = None, stall_seconds: float = JOB_STALL_SECONDS):
+        self.audio_seconds = audio_seconds
+        self.stage_costs = dict(stage_costs or {})
+        self.expected_seconds = expected_seconds
+        self.stall_seconds = stall_seconds
+        self.started = None
+        self.finished = None
+        self.updated = None
+        self.stage = "queued"
+        self.stage_started = None
+        self.stages = {}
+        self.done = 0
+        self.total = 0
+        self.rate = 0.0
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def start(self) -> None:
+        with self._changed:
+            now = time.time()
+            self.started = self.updated = self.stage_started = now
+            self.stage = "starting"
+            self._bump()
+
+    def on_event(self, event: dict) -> None:
+        now = time.time()
+        with self._changed:
+            if self.started is None or self.finished is not None:
+                return
+            self.updated = now
+            stage = event.get("stage")
+            if stage and stage != self.stage:
+                self._close_stage(now)
+                self.stage, self.stage_started = stage, now
+                self.done, self.total, self.rate = 0, 0, 0.0
+            if event.get("event") == "progress":
+                self.done, self.total = int(event.get("done") or 0), int(event.get("total") or 0)
+                elapsed = now - self.stage_started
+                self.rate = event.get("rate") or (self.done / elapsed if elapsed > 0 else 0.0)
+            self._bump()
+
+    def finish(self) -> None:
+        with self._changed:
+            now = time.time()
+            if self.started is not None:
+                self._close_stage(now)
+            self.finished = now
+            self._bump()
+
+    def _close_stage(self, now: float) -> None:
+        if self.stage not in ("queued", "done"):
+            self.stages[self.stage] = self.stages.get(self.stage, 0.0) + now - self.stage_started
+
+    def _bump(self) -> None:
+        self.version += 1
+        self._changed.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Block until the version moves past version (or timeout); returns the current one."""
+        with self._changed:
+            if self.version == version:
+                self._changed.wait(timeout)
+            return self.version
+
+    def _eta(self, now: float) -> Optional[float]:
+        if self.finished is not None:
+            return 0.0
+        if self.started is None:
+            return None
+        costs = self.stage_costs
+        stage_elapsed = now - self.stage_started
+        left = None
+        if self.rate and self.total:
+            left = (self.total - self.done) / self.rate
+        if self.stage in costs:
+            # Covers work a stage does before or after its counter runs
+            left = max(left or 0.0, costs[self.stage] * self.audio_seconds - stage_elapsed)
+        if left is None or not costs:
+            if self.expected_seconds is None:
+                return left
+            return max(left or 0.0, self.expected_seconds - (now - self.started))
+        later = STAGE_ORDER[STAGE_ORDER.index(self.stage) + 1:] if self.stage in STAGE_ORDER else ()
+        return left + sum(costs[s] * self.audio_seconds for s in later if s in costs)
+
+    def snapshot(self) -> dict:
+        """Stage, items done/total (frames, or batches in the subprocess unet stage), rate, ETA and stall state."""
+        with self._changed:
+            now = time.time()
+            running = self.started is not None and self.finished is None
+            idle = now - self.updated if running else 0.0
+            eta = self._eta(now)
+            return {
+                "stage": self.stage if self.finished is None else "done",
+                "done": self.done,
+                "total": self.total,
+                "rate": round(self.rate, 3),
+                "elapsed": round(now - self.started, 3) if self.started is not None else 0.0,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "idle_seconds": round(idle, 1),
+                "stalled": running and idle > self.stall_seconds,
+            }
+
+
+EVENT_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def encode_event(name: str, data: dict, fmt: str = "sse") -> str:
+    """One progress stream message, as a server-sent event or an NDJSON line."""
+    if fmt == "ndjson":
+        return json.dumps({"event": name, **data}) + "\n"
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Result Store - rendered MP4s kept addressable by content hash for a retention window
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+RESULT_DIR               = os.environ.get("RESULT_DIR", "/tmp/lipsync_results")
+RESULT_RETENTION_SECONDS = float(os.environ.get("RESULT_RETENTION_SECONDS", "3600"))
+
+_RESULT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultStore:
+    """One <sha256>.mp4 per distinct result; the hash doubles as id and ETag.
+
+    Files are kept for retention_seconds after their last write or access, so
+    interrupted downloads and seeking players can come back without a re-render.
+    """
+
+    def __init__(self, root: str = RESULT_DIR, retention_seconds: float = RESULT_RETENTION_SECONDS):
+        self.root = Path(root)
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def put(self, path: str) -> str:
+        """Move the file at path into the store and return its result id."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        result_id = _sha256(path)
+        dest = self.root / f"{result_id}.mp4"
+        with self._lock:
+            if dest.exists():
+                os.unlink(path)
+            else:
+                shutil.move(path, dest)
+            # A hard link from the result cache keeps the cached file's old mtime
+            os.utime(dest)
+        self.prune()
+        return result_id
+
+    def path(self, result_id: str) -> Optional[Path]:
+        """Path of a retained result (refreshing its retention), or None if unknown or expired."""
+        if not _RESULT_ID.match(result_id or ""):
+            return None
+        dest = self.root / f"{result_id}.mp4"
+        try:
+            os.utime(dest)
+        except OSError:
+            return None
+        return dest
+
+    def prune(self, force: bool = False) -> None:
+        """Delete results older than the retention window (at most once a minute unless forced)."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_prune < 60:
+                return
+            self._last_prune = now
+        cutoff = now - self.retention_seconds
+        try:
+            entries = list(self.root.iterdir())
+        except OSError:
+            return
+        for p in entries:
+            try:
+                if p.suffix == ".mp4" and p.stat().st_mtime < cutoff:
+                    p.unlink()
+            except OSError:
+                pass
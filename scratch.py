@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Scratch Space - per-job working dirs on a RAM-backed root under a byte quota, falling back to disk
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock: each process then keeps to the quota on its own
+    fcntl = None
+
+from metrics import SCRATCH_FALLBACKS, SCRATCH_JOBS, SCRATCH_RESERVED_BYTES, SCRATCH_USED_BYTES
+
+# e.g. /dev/shm/musetalk or a tmpfs mount; empty keeps all scratch on disk
+SCRATCH_RAM_DIR   = os.environ.get("SCRATCH_RAM_DIR", "")
+SCRATCH_RAM_BYTES = int(os.environ.get("SCRATCH_RAM_BYTES", str(2 * 1024 ** 3)))
+# Bytes a job reserves against the quota unless the caller knows better
+SCRATCH_JOB_BYTES = int(os.environ.get("SCRATCH_JOB_BYTES", str(256 * 1024 ** 2)))
+
+RAM, DISK = "ram", "disk"
+
+# Scratch dirs end in .<pid> of the process that made them, so a killed worker's can be found
+_OWNER = re.compile(r"\.(\d+)$")
+# RAM reservations of every process sharing the root, one <pid>.<bytes>.<id> file each
+_LEDGER = ".reservations"
+_ENTRY = re.compile(r"^(\d+)\.(\d+)\.[0-9a-f]+$")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ScratchSpace:
+    """Hands out scratch dirs, on the RAM root while reservations fit the quota.
+
+    The quota is reservation based: a job reserves its estimated size up front
+    and releases it when its dir is removed, and a job that does not fit (or is
+    larger than the whole quota) goes to disk. RAM reservations are kept in a
+    ledger on the RAM root, so every process using it (pool workers included)
+    shares one quota. The quota is also capped at 90% of the RAM filesystem's
+    size so a small /dev/shm cannot fill up.
+    """
+
+    def __init__(self, disk_root: str, ram_root: str = SCRATCH_RAM_DIR, ram_bytes: int = SCRATCH_RAM_BYTES):
+        self.disk_root = Path(disk_root)
+        self.ram_root = Path(ram_root) if ram_root else None
+        self.ram_bytes = ram_bytes if self.ram_root is not None else 0
+        if self.ram_root is not None:
+            try:
+                self.ram_root.mkdir(parents=True, exist_ok=True)
+                self.ram_bytes = min(self.ram_bytes, int(shutil.disk_usage(self.ram_root).total * 0.9))
+            except OSError:
+                self.ram_root, self.ram_bytes = None, 0
+        self._reserved = {RAM: 0, DISK: 0}
+        self._lock = threading.Lock()
+        SCRATCH_USED_BYTES.labels(RAM).set_function(lambda: self._used(self.ram_root))
+        SCRATCH_USED_BYTES.labels(DISK).set_function(lambda: self._used(self.disk_root))
+
+    @contextmanager
+    def _ledger(self):
+        """The ledger dir, locked against other processes (and threads) for the duration."""
+        ledger = self.ram_root / _LEDGER
+        ledger.mkdir(exist_ok=True)
+        with self._lock, open(self.ram_root / f"{_LEDGER}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield ledger
+
+    def _ram_reserved(self, ledger: Path) -> int:
+        """Bytes reserved on the RAM root by live processes; entries of dead ones are dropped."""
+        total = 0
+        for entry in ledger.iterdir():
+            match = _ENTRY.match(entry.name)
+            if match is None:
+                continue
+            if _alive(int(match.group(1))):
+                total += int(match.group(2))
+            else:
+                entry.unlink(missing_ok=True)
+        return total
+
+    def _reserve(self, estimate: int):
+        """(tier, ledger entry or None); RAM only if the estimate fits what every process has left."""
+        entry = None
+        if self.ram_root is not None and estimate <= self.ram_bytes:
+            try:
+                with self._ledger() as ledger:
+                    if self._ram_reserved(ledger) + estimate <= self.ram_bytes:
+                        entry = ledger / f"{os.getpid()}.{estimate}.{uuid.uuid4().hex}"
+                        entry.touch()
+            except OSError:
+                entry = None
+        tier = RAM if entry is not None else DISK
+        with self._lock:
+            self._reserved[tier] += estimate
+        if tier == DISK and self.ram_root is not None:
+            SCRATCH_FALLBACKS.inc()
+        SCRATCH_RESERVED_BYTES.labels(tier).inc(estimate)
+        return tier, entry
+
+    def _release(self, tier: str, estimate: int, entry: Path = None) -> None:
+        if entry is not None:
+            entry.unlink(missing_ok=True)
+        with self._lock:
+            self._reserved[tier] -= estimate
+        SCRATCH_RESERVED_BYTES.labels(tier).dec(estimate)
+
+    @contextmanager
+    def job(self, prefix: str = "job_", estimate: int = SCRATCH_JOB_BYTES):
+        """Private scratch directory for one invocation, removed (and its reservation released) on exit.
+
+        estimate should be an upper bound on the bytes the job writes: a job placed
+        on the RAM root cannot move to disk if it outgrows its reservation.
+        """
+        tier, entry = self._reserve(estimate)
+        try:
+            root = self.ram_root if tier == RAM else self.disk_root
+            root.mkdir(parents=True, exist_ok=True)
+            scratch = Path(tempfile.mkdtemp(prefix=prefix, suffix=f".{os.getpid()}", dir=root))
+        except OSError:
+            self._release(tier, estimate, entry)
+            if tier == DISK:
+                raise
+            # RAM root unusable right now: take the disk path instead
+            tier, entry = self._reserve_disk(estimate), None
+            self.disk_root.mkdir(parents=True, exist_ok=True)
+            scratch = Path(tempfile.mkdtemp(prefix=prefix, suffix=f".{os.getpid()}", dir=self.disk_root))
+        SCRATCH_JOBS.labels(tier).inc()
+        try:
+            yield scratch
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+            self._release(tier, estimate, entry)
+
+    def _reserve_disk(self, estimate: int) -> str:
+        with self._lock:
+            self._reserved[DISK] += estimate
+        SCRATCH_FALLBACKS.inc()
+        SCRATCH_RESERVED_BYTES.labels(DISK).inc(estimate)
+        return DISK
+
+    def purge(self, pid: int) -> int:
+        """Remove scratch dirs and reservations left behind by process pid (killed before it could clean up).
+
+        Returns the number of dirs removed.
+        """
+        removed = 0
+        if self.ram_root is not None:
+            try:
+                with self._ledger() as ledger:
+                    for entry in ledger.glob(f"{pid}.*"):
+                        entry.unlink(missing_ok=True)
+            except OSError:
+                pass
+        for root in (self.ram_root, self.disk_root):
+            if root is None or not root.is_dir():
+                continue
+            for entry in root.iterdir():
+                match = _OWNER.search(entry.name)
+                if match and int(match.group(1)) == pid and entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    @staticmethod
+    def _used(root) -> float:
+        if root is None:
+            return 0
+        return shutil.disk_usage(root).used if root.exists() else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            reserved = dict(self._reserved)
+        shared = None
+        if self.ram_root is not None:
+            try:
+                with self._ledger() as ledger:
+                    shared = self._ram_reserved(ledger)
+            except OSError:
+                pass
+        return {
+            "ram_dir": str(self.ram_root) if self.ram_root is not None else None,
+            "ram_quota_bytes": self.ram_bytes,
+            "ram_reserved_bytes": reserved[RAM],
+            "ram_reserved_bytes_all_processes": shared,
+            "disk_reserved_bytes": reserved[DISK],
+        }
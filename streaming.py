@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Lipsync Stream - render PCM that arrives in chunks, one JPEG per output frame, on the resident engine
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE
+from metrics import STREAM_FIRST_FRAME_SECONDS
+from musetalk_engine import AUDIO_PAD_RIGHT
+
+# Frames gathered before a render pass (5 at 25 fps = 200 ms of audio); fewer means lower latency, smaller batches
+STREAM_MIN_FRAMES      = int(os.environ.get("STREAM_MIN_FRAMES", "5"))
+# Audio before the first new frame fed to whisper with each pass, so features near the cut stay stable
+STREAM_CONTEXT_SECONDS = float(os.environ.get("STREAM_CONTEXT_SECONDS", "2"))
+STREAM_JPEG_QUALITY    = int(os.environ.get("STREAM_JPEG_QUALITY", "85"))
+# Longest input the whisper encoder takes in one pass
+WHISPER_WINDOW_SECONDS = 30
+
+_END = object()
+
+
+class LipsyncStream:
+    """One streaming session over a prepared avatar.
+
+    feed() and end() are called as messages arrive and only queue input;
+    render() (one caller at a time, typically a worker thread) renders every
+    frame whose audio, plus the model's lookahead, is in, and returns
+    (jpegs, done) where done marks the end of an utterance. Avatar playback
+    continues across utterances so consecutive replies don't jump.
+    """
+
+    def __init__(self, engine, avatar, min_frames: int = STREAM_MIN_FRAMES,
+                 jpeg_quality: int = STREAM_JPEG_QUALITY):
+        self.engine = engine
+        self.avatar = avatar
+        # MuseTalk maps whisper features to frames at the integer rate
+        self.fps = int(avatar.fps)
+        self.width, self.height = avatar.frames.shape[2], avatar.frames.shape[1]
+        self.min_frames = max(1, min_frames)
+        self.jpeg_quality = jpeg_quality
+        self._samples_per_frame = SAMPLE_RATE / self.fps
+        # Frame i's whisper window reaches AUDIO_PAD_RIGHT + 1 frames past it
+        self._lookahead = AUDIO_PAD_RIGHT + 1
+        self._context = int(STREAM_CONTEXT_SECONDS * self.fps)
+        self._window = WHISPER_WINDOW_SECONDS * self.fps
+        self._incoming = deque()
+        self._lock = threading.Lock()
+        self._position = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pcm = np.zeros(0, dtype=np.float32)
+        self._pcm_offset = 0  # utterance sample index of _pcm[0]
+        self._emitted = 0
+        self._ended = False
+        self._first_audio = None
+
+    def feed(self, data: bytes) -> None:
+        """Queue a chunk of 16 kHz mono s16le PCM."""
+        with self._lock:
+            self._incoming.append((time.time(), data))
+
+    def end(self) -> None:
+        """Mark the audio queued so far as one complete utterance."""
+        with self._lock:
+            self._incoming.append((time.time(), _END))
+
+    def _drain(self) -> None:
+        """Move queued input into the current utterance, stopping at its end marker."""
+        chunks = []
+        with self._lock:
+            while self._incoming and not self._ended:
+                received, data = self._incoming.popleft()
+                if data is _END:
+                    self._ended = True
+                    break
+                if self._first_audio is None:
+                    self._first_audio = received
+                chunks.append(data)
+        if chunks:
+            raw = b"".join(chunks)
+            pcm = np.frombuffer(raw[:len(raw) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+            self._pcm = np.concatenate([self._pcm, pcm])
+
+    def _available(self) -> int:
+        total = math.floor((self._pcm_offset + len(self._pcm)) / self._samples_per_frame)
+        return total if self._ended else max(0, total - self._lookahead)
+
+    def render(self) -> tuple:
+        """Render the frames that are ready; ([], False) when too few have arrived yet."""
+        self._drain()
+        ready = self._available()
+        if ready - self._emitted < (1 if self._ended else self.min_frames):
+            if self._ended:
+                self._reset()
+                return [], True
+            return [], False
+
+        start = max(0, self._emitted - self._context)
+        ready = min(ready, start + self._window - self._lookahead)
+        first = round(start * self._samples_per_frame) - self._pcm_offset
+        window = self._pcm[first:first + round(self._window * self._samples_per_frame)]
+        chunks = self.engine.pcm_chunks(window, self.fps)
+        ready = min(ready, start + len(chunks))
+        chunks = chunks[self._emitted - start:ready - start]
+
+        count = len(chunks)
+        if count == 0:
+            # Sample rounding left no whole frame; only possible at the very end of an utterance
+            ended = self._ended
+            if ended:
+                self._reset()
+            return [], ended
+        cv2 = self.engine.cv2
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        jpegs = [cv2.imencode(".jpg", frame, params)[1].tobytes()
+                 for frame in self.engine.render_frames(chunks, self.avatar, start=self._position)]
+        if jpegs and self._emitted == 0 and self._first_audio is not None:
+            STREAM_FIRST_FRAME_SECONDS.observe(time.time() - self._first_audio)
+
+        self._position += count
+        self._emitted = ready
+        # Keep only the audio the next pass needs as context
+        keep = round(max(0, self._emitted - self._context) * self._samples_per_frame) - self._pcm_offset
+        if keep > 0:
+            self._pcm = self._pcm[keep:]
+            self._pcm_offset += keep
+        done = self._ended and self._emitted >= self._available()
+        if done:
+            self._reset()
+        return jpegs, done
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Worker Pool - pre-spawned engine processes with models loaded, recycled by job count or RSS
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import cancellation
+from metrics import POOL_RECYCLES, POOL_WORKERS, RENDER_FPS, observe_stage, record_stages
+
+try:
+    import psutil
+except ImportError:  # RSS-based recycling is disabled without it
+    psutil = None
+
+POOL_WORKERS_COUNT  = int(os.environ.get("POOL_WORKERS", "1"))
+POOL_SPARES         = int(os.environ.get("POOL_SPARES", "1"))
+POOL_MAX_JOBS       = int(os.environ.get("POOL_MAX_JOBS", "200"))
+POOL_MAX_RSS_BYTES  = int(float(os.environ.get("POOL_MAX_RSS_MB", "16384")) * 1024 * 1024)
+POOL_START_TIMEOUT  = float(os.environ.get("POOL_START_TIMEOUT", "600"))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get("POOL_ACQUIRE_TIMEOUT", "900"))
+# Pause before respawning after a worker failed to start, so a broken setup doesn't spin
+POOL_RESPAWN_BACKOFF = 5.0
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+def _worker_main(conn) -> None:
+    """Child process: load the engine once, then serve requests until told to stop."""
+    # Own process group: cancelling a job kills the worker together with any ffmpeg it started
+    os.setsid()
+    import musetalk_wrapper as wrapper
+
+    ok, missing = wrapper.check_required_weights()
+    if not ok:
+        conn.send(("error", f"Missing required weight file: {missing}"))
+        return
+    try:
+        engine = wrapper.get_engine()
+        engine.load()
+    except Exception as e:
+        conn.send(("error", f"Engine failed to load: {e}"))
+        return
+    conn.send(("ready", {"pid": os.getpid(), "load_seconds": engine.load_seconds}))
+
+    while True:
+        try:
+            op, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if op == "stop":
+            return
+        # Stage timings land in this process's registry, which nobody scrapes; the parent replays them
+        with record_stages() as stages:
+            try:
+                if op == "render_many":
+                    # Progress events travel up the same pipe ahead of the result
+                    reply = engine.render_many(*args, progress=lambda event: conn.send(("progress", event)))
+                elif op == "prepare_avatar":
+                    avatar = engine.prepare_avatar(*args)
+                    reply = {"success": True, "frames": len(avatar), "fps": avatar.fps, "bytes": avatar.nbytes}
+                else:
+                    reply = {"success": False, "error": f"Unknown operation {op}"}
+            except Exception as e:
+                reply = {"success": False, "error": str(e), "logs": {"exception": repr(e)}}
+        if stages:
+            conn.send(("stages", stages))
+        conn.send(("result", reply))
+
+
+class _Worker:
+    def __init__(self, ctx, index: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), name=f"musetalk-worker-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self.pid = self.process.pid
+        self.jobs = 0
+        self.load_seconds = None
+
+    def wait_ready(self, timeout: float) -> None:
+        if not self.conn.poll(timeout):
+            raise WorkerCrashed(f"worker {self.pid} not ready after {timeout:.0f}s")
+        kind, payload = self.conn.recv()
+        if kind != "ready":
+            raise WorkerCrashed(payload)
+        self.load_seconds = payload["load_seconds"]
+
+    def call(self, op: str, *args, cancel: threading.Event = None, progress: Callable[[dict], None] = None):
+        """Run op in the worker; a set cancel kills the worker's process group and raises Cancelled.
+
+        progress receives the events the worker reports while op runs.
+        """
+        try:
+            self.conn.send((op, args))
+            while True:
+                while not self.conn.poll(cancellation.CANCEL_POLL_SECONDS):
+                    if cancel is not None and cancel.is_set():
+                        self.kill()
+                        raise cancellation.Cancelled()
+                    if not self.process.is_alive():
+                        raise WorkerCrashed(f"worker {self.pid} exited with code {self.process.exitcode}")
+                kind, reply = self.conn.recv()
+                if kind == "stages":
+                    for stage, seconds in reply:
+                        observe_stage(stage, seconds)
+                    continue
+                if kind != "progress":
+                    break
+                if progress is not None:
+                    progress(reply)
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f"worker {self.pid} connection lost: {e}")
+        return reply
+
+    def rss(self) -> int:
+        if psutil is None:
+            return 0
+        try:
+            return psutil.Process(self.pid).memory_info().rss
+        except psutil.Error:
+            return 0
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        """SIGKILL the worker and its process group now."""
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            self.process.kill()
+        self.process.join()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        try:
+            self.conn.send(("stop", ()))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """size busy-able workers plus `spares` idle warm ones, all with models already loaded.
+
+    Work goes to the most recently used idle worker (LIFO keeps the same
+    processes hot). A worker that hits max_jobs or max_rss_bytes after a job, or
+    that dies, is replaced in the background while a spare takes its place.
+    """
+
+    def __init__(self, size: int = POOL_WORKERS_COUNT, spares: int = POOL_SPARES, max_jobs: int = POOL_MAX_JOBS,
+                 max_rss_bytes: int = POOL_MAX_RSS_BYTES, scratch=None):
+        self.size = max(1, size)
+        self.spares = max(0, spares)
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        # Shared scratch roots, swept for a worker's dirs once it has been killed or crashed
+        self.scratch = scratch
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = deque()
+        self._busy = set()
+        self._starting = 0
+        self._spawned = 0
+        self._cond = threading.Condition()
+        self._started = False
+        self.last_error = None
+        POOL_WORKERS.labels("idle").set_function(lambda: len(self._idle))
+        POOL_WORKERS.labels("busy").set_function(lambda: len(self._busy))
+        POOL_WORKERS.labels("starting").set_function(lambda: self._starting)
+
+    def start(self) -> None:
+        """Spawn size + spares workers in the background (idempotent)."""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size + self.spares):
+            self._spawn()
+
+    def wait_ready(self, timeout: float = POOL_START_TIMEOUT) -> bool:
+        """Block until at least one worker is idle; False on timeout or if workers cannot start."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.last_error:
+                    return False
+                self._cond.wait(min(remaining, 1.0))
+            return True
+
+    def _spawn(self, delay: float = 0.0) -> None:
+        with self._cond:
+            self._starting += 1
+            self._spawned += 1
+            index = self._spawned
+        threading.Thread(target=self._boot, args=(index, delay), name=f"pool-boot-{index}", daemon=True).start()
+
+    def _boot(self, index: int, delay: float) -> None:
+        if delay:
+            time.sleep(delay)
+        worker = None
+        try:
+            worker = _Worker(self._ctx, index)
+            worker.wait_ready(POOL_START_TIMEOUT)
+        except Exception as e:
+            if worker is not None:
+                worker.stop(timeout=5)
+            with self._cond:
+                self._starting -= 1
+                self.last_error = str(e)
+                self._cond.notify_all()
+            self._spawn(delay=POOL_RESPAWN_BACKOFF)
+            return
+        with self._cond:
+            self._starting -= 1
+            self.last_error = None
+            self._idle.append(worker)
+            self._cond.notify_all()
+
+    def _acquire(self) -> _Worker:
+        deadline = time.monotonic() + POOL_ACQUIRE_TIMEOUT
+        with self._cond:
+            while True:
+                while self._idle and len(self._busy) < self.size:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        self._busy.add(worker)
+                        return worker
+                    # Died while idle
+                    POOL_RECYCLES.labels("crash").inc()
+                    threading.Thread(target=self._retire, args=(worker, "crash"), daemon=True).start()
+                    self._spawn()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No idle worker within {POOL_ACQUIRE_TIMEOUT:.0f}s"
+                                       + (f" (last error: {self.last_error})" if self.last_error else ""))
+                self._cond.wait(remaining)
+
+    def _release(self, worker: _Worker, reason: str = None) -> None:
+        """Return worker to the idle set, or retire it (reason: crash, cancel, jobs or rss)."""
+        if reason is None:
+            if not worker.alive():
+                reason = "crash"
+            elif self.max_jobs > 0 and worker.jobs >= self.max_jobs:
+                reason = "jobs"
+            elif self.max_rss_bytes > 0 and worker.rss() > self.max_rss_bytes:
+                reason = "rss"
+        with self._cond:
+            self._busy.discard(worker)
+            if reason is None:
+                self._idle.append(worker)
+            self._cond.notify_all()
+        if reason is not None:
+            POOL_RECYCLES.labels(reason).inc()
+            threading.Thread(target=self._retire, args=(worker, reason), daemon=True).start()
+            self._spawn()
+
+    def _retire(self, worker: _Worker, reason: str) -> None:
+        worker.stop()
+        if reason in ("crash", "cancel") and self.scratch is not None:
+            self.scratch.purge(worker.pid)
+
+    def _call(self, op: str, *args, cancel: threading.Event = None, progress: Callable[[dict], None] = None):
+        self.start()
+        worker = self._acquire()
+        reason = None
+        try:
+            return worker.call(op, *args, cancel=cancel, progress=progress)
+        except WorkerCrashed:
+            reason = "crash"
+            raise
+        except cancellation.Cancelled:
+            reason = "cancel"
+            raise
+        finally:
+            worker.jobs += 1
+            self._release(worker, reason)
+
+    def render_many(self, clips: list, video_path: str, bbox_shift: int = 0,
+                    cancel: threading.Event = None, progress: Callable[[dict], None] = None) -> list:
+        """Same contract as MuseTalkEngine.render_many, run in a pooled worker process.
+
+        Cancelling kills the worker mid-render (a fresh one is spawned in its place).
+        """
+        try:
+            results = self._call("render_many", clips, video_path, bbox_shift, cancel=cancel, progress=progress)
+        except (WorkerCrashed, TimeoutError) as e:
+            return [{"success": False, "error": str(e), "logs": {"backend": "pool"}} for _ in clips]
+        except cancellation.Cancelled:
+            return [cancellation.cancelled_result(backend="pool") for _ in clips]
+        for result in results:
+            _observe(result)
+        return results
+
+    def render(self, audio_path: str, video_path: str, output_path: str, bbox_shift: int = 0,
+               audio_hash: str = None, cancel: threading.Event = None,
+               progress: Callable[[dict], None] = None) -> dict:
+        return self.render_many([(audio_path, output_path, audio_hash)], video_path, bbox_shift, cancel,
+                                progress)[0]
+
+    def prepare_avatar(self, video_path: str) -> dict:
+        try:
+            return self._call("prepare_avatar", video_path)
+        except (WorkerCrashed, TimeoutError) as e:
+            return {"success": False, "error": str(e)}
+
+    def stats(self) -> dict:
+        with self._cond:
+            members = [(w, "busy") for w in self._busy] + [(w, "idle") for w in self._idle]
+            starting = self._starting
+        workers = [{"pid": w.pid, "jobs": w.jobs, "state": state, "rss": w.rss()} for w, state in members]
+        return {
+            "size": self.size,
+            "spares": self.spares,
+            "starting": starting,
+            "max_jobs": self.max_jobs,
+            "max_rss_bytes": self.max_rss_bytes,
+            "last_error": self.last_error,
+            "workers": workers,
+        }
+
+
+def _observe(result: dict) -> None:
+    """Stage timings arrive separately (see _Worker.call); the render rate only comes in the result."""
+    logs = result.get("logs") or {}
+    if logs.get("render_fps"):
+        RENDER_FPS.observe(logs["render_fps"])